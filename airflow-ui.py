@@ -1,10 +1,27 @@
+import asyncio
+import hashlib
+import json
 import platform
+import re
 import shutil
+import sqlite3
+import statistics
 import subprocess
+import tarfile
 import os
+import tempfile
+import threading
+import time
+import urllib.request
 import uuid
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import docker
-from flask import Flask, render_template, request, redirect, url_for
+import docker.errors
+import yaml
+from flask import Flask, render_template, request, redirect, url_for, jsonify, abort, Response, stream_with_context, send_file
 
 
 app = Flask(__name__)
@@ -18,48 +35,187 @@ def get_os_family():
     else:
         return "unknown"
 
-# Install missing package
-def install_package(tool, os_family):
+PREREQ_TOOLS = ["pip3", "podman", "openssl", "docker"]
+# Package providing each tool when it is not named after the tool itself
+PREREQ_PACKAGES = {
+    "debian": {"pip3": "python3-pip", "docker": "docker.io"},
+    "redhat": {"pip3": "python3-pip"},
+}
+PREREQ_CACHE_TTL = int(os.environ.get("ANSIBLE_UI_PREREQ_TTL", "300"))
+prereq_cache = {}
+prereq_cache_lock = threading.Lock()
+
+
+# Look up tools on PATH, probing the uncached ones concurrently
+def probe_tools(tools, refresh=False):
+    now = time.time()
+    with prereq_cache_lock:
+        found = {t: prereq_cache[t][1] for t in tools
+                 if not refresh and t in prereq_cache and now - prereq_cache[t][0] < PREREQ_CACHE_TTL}
+    stale = [t for t in tools if t not in found]
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale), thread_name_prefix="probe") as pool:
+            paths = list(pool.map(shutil.which, stale))
+        with prereq_cache_lock:
+            for tool, path in zip(stale, paths):
+                prereq_cache[tool] = (now, path)
+                found[tool] = path
+    return found
+
+
+# Install all missing packages in one transaction (one index refresh, one install)
+def install_packages(tools, os_family):
+    packages = [PREREQ_PACKAGES.get(os_family, {}).get(tool, tool) for tool in tools]
     try:
         if os_family == "debian":
             subprocess.run(["sudo", "apt", "update"], check=True)
-            subprocess.run(["sudo", "apt", "install", "-y", tool], check=True)
+            subprocess.run(["sudo", "apt", "install", "-y", *packages], check=True)
         elif os_family == "redhat":
-            subprocess.run(["sudo", "yum", "install", "-y", tool], check=True)
+            subprocess.run(["sudo", "yum", "install", "-y", *packages], check=True)
+        else:
+            return False, f"Unsupported OS family: {os_family}"
         return True, None
     except Exception as e:
         return False, str(e)
 
-# Check if Portainer is actually installed and running (or exists as a container)
-def is_portainer_installed():
+# Tool version probes shared by every route. Results are cached for ENV_PROBE_TTL seconds
+# and dropped early when the binary on PATH moves or its mtime changes (upgrade/reinstall).
+ENV_PROBES = {
+    "docker": ["docker", "--version"],
+    "docker-compose": ["docker-compose", "--version"],
+    "ansible-playbook": ["ansible-playbook", "--version"],
+    "ansible-navigator": ["ansible-navigator", "--version"],
+    "ansible-builder": ["ansible-builder", "--version"],
+    "git": ["git", "--version"],
+}
+ENV_PROBE_TTL = int(os.environ.get("ANSIBLE_UI_ENV_TTL", "600"))
+env_cache = {}
+env_cache_lock = threading.Lock()
+
+
+def probe_binary(name):
+    cmd = ENV_PROBES[name]
+    path = shutil.which(cmd[0])
+    entry = {"name": name, "path": path, "mtime": None, "version": None, "checked": time.time()}
+    if path:
+        try:
+            entry["mtime"] = os.stat(path).st_mtime
+            result = subprocess.run([path, *cmd[1:]], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, timeout=30)
+            if result.returncode == 0:
+                entry["version"] = result.stdout.strip()
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    return entry
+
+
+def env_entry_is_fresh(entry):
+    if time.time() - entry["checked"] > ENV_PROBE_TTL:
+        return False
+    path = shutil.which(ENV_PROBES[entry["name"]][0])
+    if path != entry["path"]:
+        return False
+    if path is None:
+        return True
     try:
-        result = subprocess.run(
-            ["docker", "inspect", "-f", "{{.State.Running}}", "portainer"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.DEVNULL,
-            text=True
-        )
-        return result.stdout.strip() in ["true", "false"]
-    except Exception:
+        return os.stat(path).st_mtime == entry["mtime"]
+    except OSError:
         return False
 
+
+def get_environment(names=None, refresh=False):
+    """Return {name: {path, version, mtime, checked}}, re-probing stale entries concurrently."""
+    names = list(names or ENV_PROBES)
+    with env_cache_lock:
+        entries = {n: env_cache[n] for n in names if n in env_cache}
+    stale = [n for n in names if refresh or n not in entries or not env_entry_is_fresh(entries[n])]
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale), thread_name_prefix="env-probe") as pool:
+            probed = list(pool.map(probe_binary, stale))
+        with env_cache_lock:
+            for entry in probed:
+                env_cache[entry["name"]] = entry
+                entries[entry["name"]] = entry
+    return entries
+
+
+# Templates can call environment() / environment(["docker"]) for the cached probe data
+@app.context_processor
+def inject_environment():
+    return {"environment": get_environment}
+
+
+# One Docker SDK client for the whole app. Its HTTP connections to the Docker socket are
+# pooled and kept alive, so a status check is a single API round-trip instead of a CLI fork.
+DOCKER_POOL_SIZE = int(os.environ.get("ANSIBLE_UI_DOCKER_POOL_SIZE", "16"))
+docker_client = None
+docker_client_lock = threading.Lock()
+
+
+def get_docker_client():
+    global docker_client
+    with docker_client_lock:
+        if docker_client is None:
+            docker_client = docker.from_env(max_pool_size=DOCKER_POOL_SIZE)
+        return docker_client
+
+
+# Return the Portainer container state ("running", "exited", ...) or None if it does not exist
+def portainer_status():
+    try:
+        return get_docker_client().containers.get("portainer").status
+    except docker.errors.NotFound:
+        return None
+    except docker.errors.DockerException as e:
+        app.logger.warning("Could not query Docker for Portainer: %s", e)
+        return None
+
+# Check if Portainer is actually installed and running (or exists as a container)
+def is_portainer_installed():
+    return portainer_status() is not None
+
 # Actually run Portainer
 def run_portainer():
     try:
-        subprocess.run(["docker", "volume", "create", "portainer_data"], check=True)
-        subprocess.run([
-            "docker", "run", "-d",
-            "-p", "9443:9443", "-p", "9000:9000",
-            "--name", "portainer",
-            "--restart=always",
-            "-v", "/var/run/docker.sock:/var/run/docker.sock",
-            "-v", "portainer_data:/data",
-            "portainer/portainer-ce:latest"
-        ], check=True)
+        client = get_docker_client()
+        client.volumes.create("portainer_data")
+        client.containers.run(
+            "portainer/portainer-ce:latest",
+            detach=True,
+            name="portainer",
+            ports={"9443/tcp": 9443, "9000/tcp": 9000},
+            restart_policy={"Name": "always"},
+            volumes={
+                "/var/run/docker.sock": {"bind": "/var/run/docker.sock", "mode": "rw"},
+                "portainer_data": {"bind": "/data", "mode": "rw"},
+            }
+        )
         return True, "✅ Portainer installed successfully."
-    except subprocess.CalledProcessError as e:
+    except docker.errors.DockerException as e:
         return False, f"❌ Docker Error: {str(e)}"
 
+# Containers of the Airflow docker-compose project, straight from the Docker API
+def airflow_compose_status(project="airflow"):
+    try:
+        containers = get_docker_client().containers.list(
+            all=True, sparse=True, filters={"label": f"com.docker.compose.project={project}"}
+        )
+    except docker.errors.DockerException as e:
+        app.logger.warning("Could not query Docker for Airflow: %s", e)
+        return []
+    return sorted(
+        (
+            {
+                "name": c.attrs["Names"][0].lstrip("/"),
+                "service": c.attrs.get("Labels", {}).get("com.docker.compose.service"),
+                "state": c.attrs.get("State"),
+                "status": c.attrs.get("Status"),
+            }
+            for c in containers
+        ),
+        key=lambda c: c["name"]
+    )
+
 # Routes
 @app.route("/")
 def home():
@@ -80,22 +236,34 @@ def install_portainer_route():
 
     return render_template("portainer.html", installed=installed, message=message, url=portainer_url)
 
+@app.route("/status")
+def service_status():
+    return jsonify(portainer=portainer_status(), airflow=airflow_compose_status())
+
+@app.route("/environment")
+def environment_info():
+    return jsonify(get_environment(refresh=request.args.get("refresh") == "1"))
+
 @app.route("/pre-req")
 def prereq():
-    tools = ["pip3", "podman", "openssl", "docker"]
+    tools = PREREQ_TOOLS
     results = {}
     os_family = get_os_family()
 
+    found = probe_tools(tools, refresh=request.args.get("refresh") == "1")
+    missing = [tool for tool in tools if not found[tool]]
+    if missing:
+        success, error = install_packages(missing, os_family)
+        found.update(probe_tools(missing, refresh=True))
+
     for tool in tools:
-        if shutil.which(tool):
+        if tool not in missing:
             results[tool] = "✅ Installed"
+        elif found[tool]:
+            results[tool] = "❌ Not Found → 🛠️ Installed"
         else:
-            success, error = install_package(tool, os_family)
-            if success:
-                results[tool] = "❌ Not Found → 🛠️ Installed"
-            else:
-                results[tool] = f"❌ Not Found → ❌ Error: {error}"
-    docker_installed = shutil.which("docker") is not None
+            results[tool] = f"❌ Not Found → ❌ Error: {error or 'package installed but tool still not on PATH'}"
+    docker_installed = found["docker"] is not None
     return render_template("prereq.html", results=results, os_family=os_family, docker_installed=docker_installed)
 
 
@@ -113,19 +281,17 @@ def airflow_setup():
     try:
         output_logs = ""
 
+        env = get_environment(["docker", "docker-compose"])
+
         # Check if Docker is installed
-        try:
-            docker_version = subprocess.check_output(["docker", "--version"], stderr=subprocess.STDOUT).decode()
-            output_logs += f"🐳 Docker found: {docker_version}\n"
-        except FileNotFoundError:
+        if not env["docker"]["path"]:
             return render_template("airflow_setup.html", result="❌ Docker is not installed.")
+        output_logs += f"🐳 Docker found: {env['docker']['version']}\n"
 
         # Check if Docker Compose is installed
-        try:
-            compose_version = subprocess.check_output(["docker-compose", "--version"], stderr=subprocess.STDOUT).decode()
-            output_logs += f"📦 Docker Compose found: {compose_version}\n"
-        except FileNotFoundError:
+        if not env["docker-compose"]["path"]:
             return render_template("airflow_setup.html", result="❌ Docker Compose is not installed.")
+        output_logs += f"📦 Docker Compose found: {env['docker-compose']['version']}\n"
 
         # Create airflow directory if not exists
         airflow_dir = "airflow"
@@ -161,22 +327,16 @@ def airflow_setup():
 @app.route("/ansible/execution-environment")
 def ansible_exec_env():
     try:
-        nav_version = ""
-        builder_version = ""
+        env = get_environment(["ansible-navigator", "ansible-builder"])
 
-        # Check if ansible-navigator is already installed
-        try:
-            nav_version = subprocess.check_output(["ansible-navigator", "--version"], stderr=subprocess.STDOUT).decode().strip()
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            subprocess.run(["pip3", "install", "ansible-navigator"], check=True)
-            nav_version = subprocess.check_output(["ansible-navigator", "--version"]).decode().strip()
+        # Install ansible-navigator / ansible-builder if they are not already installed
+        for tool in ("ansible-navigator", "ansible-builder"):
+            if not env[tool]["version"]:
+                subprocess.run(["pip3", "install", tool], check=True)
+                env.update(get_environment([tool], refresh=True))
 
-        # Check if ansible-builder is already installed
-        try:
-            builder_version = subprocess.check_output(["ansible-builder", "--version"], stderr=subprocess.STDOUT).decode().strip()
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            subprocess.run(["pip3", "install", "ansible-builder"], check=True)
-            builder_version = subprocess.check_output(["ansible-builder", "--version"]).decode().strip()
+        nav_version = env["ansible-navigator"]["version"]
+        builder_version = env["ansible-builder"]["version"]
 
         message = (
             "✅ Prerequisites for Ansible Execution Environment are ready.<br><br>"
@@ -200,88 +360,837 @@ def ansible_exec_env():
 
 
 
+WORKER_IMAGE = "arunvel1988/ansible_worker_node"
+WORKER_INVENTORY_FILE = "inventory.ini"
+# How many containers are started/removed at the same time when creating or deleting worker nodes
+PROVISION_FAN_OUT = int(os.environ.get("ANSIBLE_UI_PROVISION_FAN_OUT", "8"))
+# Worker nodes are labelled at creation so Docker can filter them server-side
+WORKER_LABEL = "ansible-ui.worker"
+WORKER_GROUP_LABEL = "ansible-ui.group"
+WORKER_CONNECTION_LABEL = "ansible-ui.connection"
+WORKER_AUTH_LABEL = "ansible-ui.auth"
+WORKER_SSH_REUSE_LABEL = "ansible-ui.ssh-reuse"
+# "docker" nodes are reached through the Docker API (community.docker.docker) instead of SSH
+WORKER_CONNECTIONS = ("ssh", "docker")
+# Labels cannot be changed on a running container, so the settings of nodes handed out
+# from the warm pool are kept here instead (container id -> label-style settings)
+WORKER_ASSIGNMENTS_FILE = os.environ.get("ANSIBLE_UI_WORKER_ASSIGNMENTS", "./.worker_assignments.json")
+
+worker_assignments_lock = threading.Lock()
+
+
+def write_file_atomic(path, text):
+    """Write `text` to a temp file and rename it into place so readers never see a partial file."""
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def load_worker_assignments():
+    try:
+        with open(WORKER_ASSIGNMENTS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+worker_assignments = load_worker_assignments()
+
+
+def set_worker_assignment(container_id, labels):
+    """Record (or with labels=None, forget) the settings of a pooled node and persist them."""
+    with worker_assignments_lock:
+        if labels is None:
+            if worker_assignments.pop(container_id, None) is None:
+                return
+        else:
+            worker_assignments[container_id] = labels
+        write_file_atomic(WORKER_ASSIGNMENTS_FILE, json.dumps(worker_assignments))
+
+
+def find_worker_containers(client):
+    """Return worker containers using server-side filters and sparse (non-inspected) results.
+
+    The name filter still picks up nodes created before they were labelled.
+    """
+    found = {}
+    for filters in ({"label": WORKER_LABEL}, {"name": "ubuntu-node"}):
+        for container in client.containers.list(all=True, sparse=True, filters=filters):
+            found.setdefault(container.id, container)
+    return list(found.values())
+
+
+def worker_node_info(container):
+    """Return (name, ssh_port, status) from either a sparse list entry or a full inspect."""
+    attrs = container.attrs
+    if "Names" in attrs:
+        name = attrs["Names"][0].lstrip("/")
+        ssh_port = next((str(p["PublicPort"]) for p in attrs.get("Ports") or []
+                         if p.get("PrivatePort") == 22 and p.get("PublicPort")), "N/A")
+    else:
+        name = container.name
+        ports = attrs['NetworkSettings']['Ports'] or {}
+        ssh_port = (ports.get("22/tcp") or [{}])[0].get("HostPort", "N/A")
+    return name, ssh_port, container.status
+
+
+def worker_node_details(container):
+    """Node name, port and status plus the group/connection/auth settings recorded in its labels."""
+    name, ssh_port, status = worker_node_info(container)
+    attrs = container.attrs
+    labels = (attrs.get("Labels") if "Names" in attrs else attrs.get("Config", {}).get("Labels")) or {}
+    labels = {**labels, **worker_assignments.get(container.id, {})}
+    return {
+        "name": name,
+        "port": ssh_port,
+        "status": status,
+        "group": labels.get(WORKER_GROUP_LABEL, "ungrouped"),
+        "connection": labels.get(WORKER_CONNECTION_LABEL, "ssh"),
+        "auth": labels.get(WORKER_AUTH_LABEL, "password"),
+        "ssh_reuse": labels.get(WORKER_SSH_REUSE_LABEL, "false") == "true",
+    }
+
+
+def list_worker_node_details(client):
+    nodes = [worker_node_details(c) for c in find_worker_containers(client)]
+    return sorted((n for n in nodes if n["name"].startswith("ubuntu-node")), key=lambda n: n["name"])
+
+
+def list_worker_nodes(client):
+    return [(n["name"], n["port"], n["status"]) for n in list_worker_node_details(client)]
+
+
+class WorkerNodeCache:
+    """In-memory view of the worker containers, kept fresh from the Docker events stream.
+
+    A background thread does one full listing, then applies container events as they
+    arrive, so page loads never have to ask Docker about every container on the host.
+    """
+
+    STATE_EVENTS = {"create", "start", "restart", "stop", "die", "kill", "oom",
+                    "pause", "unpause", "rename", "update", "destroy"}
+
+    def __init__(self):
+        self.nodes = {}
+        self.version = 0
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._watch, name="worker-node-cache", daemon=True)
+                self.thread.start()
+
+    def _watch(self):
+        while True:
+            try:
+                client = get_docker_client()
+                # Subscribe from just before the full listing so no event is lost in between
+                since = int(time.time()) - 1
+                self.refresh(client)
+                for event in client.events(decode=True, since=since, filters={"type": "container"}):
+                    self._apply(client, event)
+            except Exception as e:
+                app.logger.warning("Worker node cache lost the Docker events stream: %s", e)
+            self.ready.clear()
+            time.sleep(5)
+
+    def refresh(self, client):
+        nodes = {}
+        for container in find_worker_containers(client):
+            details = worker_node_details(container)
+            if details["name"].startswith("ubuntu-node"):
+                nodes[container.id] = details
+        with self.lock:
+            if nodes != self.nodes:
+                self.nodes = nodes
+                self.version += 1
+        self.ready.set()
+
+    def _apply(self, client, event):
+        action = (event.get("Action") or event.get("status") or "").split(":")[0]
+        if action not in self.STATE_EVENTS:
+            return
+        actor = event.get("Actor") or {}
+        container_id = event.get("id") or actor.get("ID")
+        attributes = actor.get("Attributes")
+        with self.lock:
+            tracked = container_id in self.nodes
+        # Events carry the container's labels and (new) name, so unrelated containers cost no API call.
+        # Same rule as find_worker_containers: labelled nodes plus unlabelled ones matched by name.
+        if attributes and not tracked and (attributes.get(WORKER_LABEL) != "true"
+                                           and "ubuntu-node" not in attributes.get("name", "")):
+            return
+        details = None
+        if action != "destroy":
+            matches = client.containers.list(all=True, sparse=True, filters={"id": container_id})
+            details = worker_node_details(matches[0]) if matches else None
+        with self.lock:
+            if details and details["name"].startswith("ubuntu-node"):
+                changed = self.nodes.get(container_id) != details
+                self.nodes[container_id] = details
+            else:
+                changed = self.nodes.pop(container_id, None) is not None
+            if changed:
+                self.version += 1
+
+    def details(self, client):
+        """Return (node detail dicts, cache version). The version is None when answered without the cache."""
+        if not self.ready.is_set():
+            # Events stream not up (yet); answer from Docker directly
+            return list_worker_node_details(client), None
+        with self.lock:
+            return sorted(self.nodes.values(), key=lambda n: n["name"]), self.version
+
+    def snapshot(self, client):
+        nodes, _ = self.details(client)
+        return [(n["name"], n["port"], n["status"]) for n in nodes]
+
+
+worker_node_cache = WorkerNodeCache()
+
+
+class WorkerInventory:
+    """Ansible inventory generated from the live worker containers.
+
+    Built from the node cache and memoised on the cache version, so it is rebuilt only
+    after a container event changed something and is otherwise a memory lookup.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.version = None
+        self.inventory = None
+        self.lock = threading.Lock()
+
+    def get(self, client):
+        nodes, version = self.cache.details(client)
+        with self.lock:
+            if version is not None and version == self.version:
+                return self.inventory
+
+        groups, hostvars = {}, {}
+        for node in nodes:
+            if node["status"] != "running":
+                continue
+            groups.setdefault(node["group"], []).append(node["name"])
+            hostvars[node["name"]] = worker_hostvars(node)
+        inventory = {"groups": groups, "hostvars": hostvars}
+
+        if version is not None:
+            with self.lock:
+                self.version, self.inventory = version, inventory
+        return inventory
+
+
+worker_inventory = WorkerInventory(worker_node_cache)
+
+
+def inventory_as_script_json(inventory):
+    """The --list format expected from executable (script) inventories."""
+    data = {group: {"hosts": hosts} for group, hosts in inventory["groups"].items()}
+    data["all"] = {"children": sorted(inventory["groups"])}
+    data["_meta"] = {"hostvars": inventory["hostvars"]}
+    return data
+
+
+def inventory_as_yaml_plugin(inventory):
+    """Structure read by Ansible's yaml inventory plugin (which also accepts .json files)."""
+    return {"all": {"children": {
+        group: {"hosts": {host: inventory["hostvars"][host] for host in hosts}}
+        for group, hosts in inventory["groups"].items()
+    }}}
+
+
+def inventory_as_ini(inventory):
+    lines = []
+    for group, hosts in sorted(inventory["groups"].items()):
+        lines.append(f"[{group}]")
+        for host in hosts:
+            pairs = []
+            for key, value in inventory["hostvars"][host].items():
+                value = str(value).lower() if isinstance(value, bool) else str(value)
+                pairs.append(f"{key}='{value}'" if " " in value else f"{key}={value}")
+            lines.append(f"{host} {' '.join(pairs)}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def sync_inventory_file(client):
+    """Re-render inventory.ini from live state so every group created through the UI is kept."""
+    write_file_atomic(WORKER_INVENTORY_FILE, inventory_as_ini(worker_inventory.get(client)))
+
+
+def write_inventory_snapshot(client):
+    """Write the current inventory to a private per-run file and return its path."""
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    path = os.path.join(JOBS_DIR, f"inventory-{uuid.uuid4().hex[:12]}.json")
+    with open(path, "w") as f:
+        json.dump(inventory_as_yaml_plugin(worker_inventory.get(client)), f)
+    return path
+
+
+@app.route("/ansible/local/inventory")
+def dynamic_inventory():
+    """Live worker inventory: script --list JSON by default, ?host=<name> for hostvars, ?format=ini."""
+    client = get_docker_client()
+    worker_node_cache.start()
+    inventory = worker_inventory.get(client)
+    if request.args.get("host"):
+        return jsonify(inventory["hostvars"].get(request.args["host"], {}))
+    if request.args.get("format") == "ini":
+        return Response(inventory_as_ini(inventory), mimetype="text/plain")
+    return jsonify(inventory_as_script_json(inventory))
+
+
+# Key pair generated once and pushed into every new worker node for password-less SSH
+WORKER_SSH_KEY = os.environ.get("ANSIBLE_UI_SSH_KEY", "./.ssh_keys/ansible_ui_ed25519")
+# Keep one SSH master connection per node open between tasks (ControlPersist) and pipeline modules
+SSH_REUSE = os.environ.get("ANSIBLE_UI_SSH_REUSE", "1") == "1"
+SSH_CONTROL_PERSIST = os.environ.get("ANSIBLE_UI_SSH_CONTROL_PERSIST", "60s")
+SSH_REUSE_ARGS = f"-o ControlMaster=auto -o ControlPersist={SSH_CONTROL_PERSIST}"
+
+ssh_key_lock = threading.Lock()
+
+
+def ensure_worker_ssh_key():
+    """Create the worker SSH key pair on first use and return the public key."""
+    with ssh_key_lock:
+        if not os.path.exists(WORKER_SSH_KEY):
+            os.makedirs(os.path.dirname(WORKER_SSH_KEY), mode=0o700, exist_ok=True)
+            subprocess.run(
+                ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-C", "ansible-ui", "-f", WORKER_SSH_KEY],
+                check=True
+            )
+        with open(f"{WORKER_SSH_KEY}.pub") as f:
+            return f.read().strip()
+
+
+def authorize_worker_key(container, public_key):
+    result = container.exec_run(
+        ["sh", "-c",
+         "mkdir -p ~arun/.ssh && echo \"$KEY\" >> ~arun/.ssh/authorized_keys && "
+         "chmod 700 ~arun/.ssh && chmod 600 ~arun/.ssh/authorized_keys && chown -R arun:arun ~arun/.ssh"],
+        user="root",
+        environment={"KEY": public_key}
+    )
+    if result.exit_code != 0:
+        raise RuntimeError(f"could not install SSH key: {result.output.decode(errors='replace').strip()}")
+
+
+def worker_hostvars(node):
+    """Ansible connection variables for one worker node (see worker_node_details)."""
+    if node["connection"] == "docker":
+        return {
+            "ansible_connection": "community.docker.docker",
+            "ansible_host": node["name"],
+            "ansible_python_interpreter": "/usr/bin/python3",
+        }
+    hostvars = {"ansible_host": "127.0.0.1", "ansible_port": node["port"], "ansible_user": "arun"}
+    if node["auth"] == "key":
+        hostvars["ansible_ssh_private_key_file"] = os.path.abspath(WORKER_SSH_KEY)
+    else:
+        hostvars["ansible_password"] = "arun"
+    hostvars["ansible_python_interpreter"] = "/usr/bin/python3"
+    if node["ssh_reuse"]:
+        hostvars["ansible_pipelining"] = True
+        hostvars["ansible_ssh_common_args"] = f"-o StrictHostKeyChecking=no {SSH_REUSE_ARGS}"
+    else:
+        hostvars["ansible_ssh_common_args"] = "-o StrictHostKeyChecking=no"
+    return hostvars
+
+
+def start_worker_node(client, name, host_port, host_group, position, total, public_key=None, ssh_reuse=SSH_REUSE):
+    """Start one node; a `host_port` of None means docker-connection mode with no published SSH port."""
+    started = time.time()
+    try:
+        container = client.containers.run(
+            WORKER_IMAGE,
+            detach=True,
+            name=name,
+            hostname=name,
+            ports={"22/tcp": host_port} if host_port else None,
+            labels={
+                WORKER_LABEL: "true",
+                WORKER_GROUP_LABEL: host_group,
+                WORKER_CONNECTION_LABEL: "ssh" if host_port else "docker",
+                WORKER_AUTH_LABEL: "key" if public_key else "password",
+                WORKER_SSH_REUSE_LABEL: "true" if ssh_reuse else "false",
+            }
+        )
+        if public_key:
+            authorize_worker_key(container, public_key)
+        error = None
+    except Exception as e:
+        error = str(e)
+    elapsed = time.time() - started
+    app.logger.info("[%d/%d] worker node %s %s in %.1fs", position, total, name,
+                    "failed" if error else "started", elapsed)
+    return {"name": name, "port": host_port, "ok": error is None, "error": error, "seconds": elapsed}
+
+
+def claim_pool_node(client, entry, name, host_port, host_group, position, total, public_key=None,
+                    ssh_reuse=SSH_REUSE):
+    """Hand out an idle warm-pool container as `name`, falling back to a cold start if it is gone."""
+    started = time.time()
+    connection = "ssh" if host_port else "docker"
+    try:
+        container = client.containers.get(entry["id"])
+        container.reload()
+        if container.status != "running":
+            raise RuntimeError(f"container is {container.status}")
+        # Record the settings before the rename so the cache sees them with the rename event
+        set_worker_assignment(entry["id"], {
+            WORKER_GROUP_LABEL: host_group,
+            WORKER_CONNECTION_LABEL: connection,
+            WORKER_AUTH_LABEL: "key" if public_key else "password",
+            WORKER_SSH_REUSE_LABEL: "true" if ssh_reuse else "false",
+        })
+        container.rename(name)
+        if public_key:
+            authorize_worker_key(container, public_key)
+    except Exception as e:
+        app.logger.warning("Warm pool node %s unusable (%s); starting %s cold", entry["id"][:12], e, name)
+        # Drop the half-claimed node so it can neither hold `name` nor linger outside the pool
+        try:
+            client.containers.get(entry["id"]).remove(force=True)
+        except Exception:
+            pass
+        set_worker_assignment(entry["id"], None)
+        return start_worker_node(client, name, host_port, host_group, position, total, public_key, ssh_reuse)
+    elapsed = time.time() - started
+    app.logger.info("[%d/%d] worker node %s taken from the warm pool in %.1fs", position, total, name, elapsed)
+    # Pool nodes publish SSH on a Docker-assigned port rather than base_port + i
+    return {"name": name, "port": entry["port"] if host_port else None, "ok": True, "error": None,
+            "seconds": elapsed, "pooled": True}
+
+
+def provision_worker_nodes(client, count, base_port, host_group, fan_out=PROVISION_FAN_OUT, public_key=None,
+                           ssh_reuse=SSH_REUSE, use_pool=True):
+    """Start `count` worker containers concurrently, at most `fan_out` at a time.
+
+    Idle warm-pool containers are handed out first; only the remainder is started cold.
+    A `base_port` of None publishes no SSH ports (docker connection mode).
+    With `public_key`, the key is authorized for the arun user on every node.
+    Returns one result dict per node, in node order.
+    """
+    specs = [(f"ubuntu-node{i+1}-{str(uuid.uuid4())[:8]}", base_port + i if base_port else None) for i in range(count)]
+    pooled = worker_pool.claim(count) if use_pool else []
+    with ThreadPoolExecutor(max_workers=max(1, min(fan_out, count)), thread_name_prefix="provision") as pool:
+        futures = []
+        for i, (name, port) in enumerate(specs):
+            if i < len(pooled):
+                futures.append(pool.submit(claim_pool_node, client, pooled[i], name, port, host_group,
+                                           i + 1, count, public_key, ssh_reuse))
+            else:
+                futures.append(pool.submit(start_worker_node, client, name, port, host_group,
+                                           i + 1, count, public_key, ssh_reuse))
+        return [f.result() for f in futures]
+
+
+def remove_worker_node(container):
+    name = worker_node_info(container)[0]
+    try:
+        container.remove(force=True)
+        set_worker_assignment(container.id, None)
+        return {"name": name, "ok": True, "error": None}
+    except Exception as e:
+        return {"name": name, "ok": False, "error": str(e)}
+
+
+def teardown_worker_nodes(client, fan_out=PROVISION_FAN_OUT):
+    """Force-remove every worker container concurrently. Returns one result dict per node."""
+    containers = [c for c in find_worker_containers(client) if worker_node_info(c)[0].startswith("ubuntu-node")]
+    if not containers:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(fan_out, len(containers))), thread_name_prefix="teardown") as pool:
+        return list(pool.map(remove_worker_node, containers))
+
+
+# A node is handed out only once sshd answers with its banner (or, for docker nodes, exec works)
+READINESS_TIMEOUT = float(os.environ.get("ANSIBLE_UI_READINESS_TIMEOUT", "60"))
+READINESS_FIRST_DELAY = 0.1
+READINESS_MAX_DELAY = 2.0
+READINESS_HISTORY = 100
+
+worker_readiness = {}
+readiness_batches = deque(maxlen=READINESS_HISTORY)
+readiness_lock = threading.Lock()
+
+
+async def ssh_banner_ready(port, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", port), timeout)
+    try:
+        banner = await asyncio.wait_for(reader.readline(), timeout)
+    finally:
+        writer.close()
+    if not banner.startswith(b"SSH-"):
+        raise ConnectionError(f"unexpected banner {banner[:40]!r}")
+
+
+async def docker_exec_ready(client, name):
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, lambda: client.containers.get(name).exec_run(["true"]))
+    if result.exit_code != 0:
+        raise RuntimeError(f"exec exited with {result.exit_code}")
+
+
+async def wait_for_node(client, name, port, timeout):
+    """Probe one node with exponential backoff until it answers or `timeout` runs out.
+
+    `port` may come straight from worker_node_info, so "N/A" (nothing published) counts as not ready.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    if port is not None and not str(port).isdigit():
+        return {"name": name, "ready": False, "seconds": 0.0, "attempts": 0,
+                "error": f"no SSH port published ({port})"}
+    port = int(port) if port is not None else None
+    deadline = started + timeout
+    delay, attempts, error = READINESS_FIRST_DELAY, 0, None
+    while True:
+        attempts += 1
+        try:
+            if port:
+                await ssh_banner_ready(port, max(0.1, min(5.0, deadline - loop.time())))
+            else:
+                await docker_exec_ready(client, name)
+            error = None
+            break
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        if loop.time() >= deadline:
+            break
+        await asyncio.sleep(min(delay, deadline - loop.time()))
+        delay = min(delay * 2, READINESS_MAX_DELAY)
+    return {"name": name, "ready": error is None, "seconds": loop.time() - started,
+            "attempts": attempts, "error": error}
+
+
+def probe_readiness(client, nodes, source="create", timeout=READINESS_TIMEOUT):
+    """Probe all `nodes` ((name, ssh_port or None) pairs) concurrently on one event loop.
+
+    Records each node's result in worker_readiness and the batch timing in readiness_batches.
+    """
+    nodes = list(nodes)
+    if not nodes:
+        return []
+
+    async def probe_all():
+        return await asyncio.gather(*(wait_for_node(client, name, port, timeout) for name, port in nodes))
+
+    started = time.time()
+    results = asyncio.run(probe_all())
+    ready = [r["seconds"] for r in results if r["ready"]]
+    batch = {
+        "at": started,
+        "source": source,
+        "nodes": len(results),
+        "ready": len(ready),
+        # Time until the whole batch could be used; None when some node never came up
+        "fleet_ready_seconds": time.time() - started if len(ready) == len(results) else None,
+        "median_seconds": statistics.median(ready) if ready else None,
+        "max_seconds": max(ready) if ready else None,
+        "attempts": sum(r["attempts"] for r in results),
+    }
+    with readiness_lock:
+        for r in results:
+            worker_readiness[r["name"]] = r
+        readiness_batches.append(batch)
+    app.logger.info("Readiness: %d/%d %s nodes ready in %.1fs", batch["ready"], batch["nodes"], source,
+                    time.time() - started)
+    return results
+
+
+def readiness_metrics():
+    """Aggregate readiness timings over the recent probe batches."""
+    with readiness_lock:
+        batches = list(readiness_batches)
+    per_source = {}
+    for batch in batches:
+        per_source.setdefault(batch["source"], []).append(batch)
+
+    metrics = {}
+    for source, group in per_source.items():
+        fleet = [b["fleet_ready_seconds"] for b in group if b["fleet_ready_seconds"] is not None]
+        slowest = sorted(b["max_seconds"] for b in group if b["max_seconds"] is not None)
+        metrics[source] = {
+            "batches": len(group),
+            "nodes": sum(b["nodes"] for b in group),
+            "ready": sum(b["ready"] for b in group),
+            "fleet_ready_seconds_median": statistics.median(fleet) if fleet else None,
+            "fleet_ready_seconds_max": max(fleet) if fleet else None,
+            "slowest_node_seconds_p95": slowest[int(0.95 * (len(slowest) - 1))] if slowest else None,
+            "attempts_per_node": sum(b["attempts"] for b in group) / max(1, sum(b["nodes"] for b in group)),
+        }
+    return {"sources": metrics, "recent": batches[-10:]}
+
+
+@app.route("/ansible/local/worker_readiness")
+def worker_readiness_status():
+    with readiness_lock:
+        nodes = dict(worker_readiness)
+    return jsonify({"nodes": nodes, **readiness_metrics()})
+
+
+# Warm pool: idle, already-started nodes waiting to be handed out (0 disables it)
+WORKER_POOL_SIZE = int(os.environ.get("ANSIBLE_UI_WORKER_POOL_SIZE", "0"))
+# Drain the pool when nobody has taken a node for this long; it refills on the next request
+WORKER_POOL_IDLE_TTL = int(os.environ.get("ANSIBLE_UI_WORKER_POOL_IDLE_TTL", "3600"))
+WORKER_POOL_CHECK_INTERVAL = 30
+WORKER_POOL_LABEL = "ansible-ui.pool"
+WORKER_POOL_PREFIX = "ansible-ui-pool-"
+
+
+class WorkerPool:
+    """Keeps `capacity` idle worker containers started so creating nodes is a rename, not a cold start.
+
+    Pool containers carry WORKER_LABEL plus WORKER_POOL_LABEL and a non-"ubuntu-node" name, so
+    they stay out of the node list and the inventory until claimed. A background thread
+    replenishes after every claim and evicts the idle nodes once the pool is unused for
+    `idle_ttl` seconds.
+    """
+
+    def __init__(self, capacity, idle_ttl):
+        self.capacity = capacity
+        self.idle_ttl = idle_ttl
+        self.idle = deque()
+        self.starting = 0
+        self.last_claim = time.time()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._maintain, name="worker-pool", daemon=True)
+                self.thread.start()
+
+    def resize(self, capacity):
+        with self.lock:
+            self.capacity = max(0, capacity)
+            self.last_claim = time.time()
+        self.start()
+        self.wake.set()
+
+    def claim(self, count):
+        """Take up to `count` idle nodes; returns their entries ({id, port, since})."""
+        with self.lock:
+            self.last_claim = time.time()
+            taken = [self.idle.popleft() for _ in range(min(count, len(self.idle)))]
+        if self.capacity:
+            self.start()
+            self.wake.set()
+        return taken
+
+    def status(self):
+        with self.lock:
+            return {
+                "capacity": self.capacity,
+                "idle": len(self.idle),
+                "starting": self.starting,
+                "idle_ttl": self.idle_ttl,
+                "draining": time.time() - self.last_claim >= self.idle_ttl,
+            }
+
+    def _maintain(self):
+        try:
+            self.adopt(get_docker_client())
+        except Exception as e:
+            app.logger.warning("Could not adopt existing warm pool nodes: %s", e)
+        while True:
+            try:
+                self.reconcile(get_docker_client())
+            except Exception as e:
+                app.logger.warning("Warm pool maintenance failed: %s", e)
+            self.wake.wait(WORKER_POOL_CHECK_INTERVAL)
+            self.wake.clear()
+
+    def adopt(self, client):
+        """Pick up idle pool containers left running by a previous process."""
+        for container in client.containers.list(filters={"label": WORKER_POOL_LABEL}):
+            name, port, _ = worker_node_info(container)
+            if name.startswith(WORKER_POOL_PREFIX):
+                with self.lock:
+                    self.idle.append({"id": container.id, "port": port, "since": time.time()})
+
+    def _remove_idle(self, client, entry):
+        """Force-remove an idle node unless it has been renamed, i.e. handed out (possibly by another process)."""
+        try:
+            container = client.containers.get(entry["id"])
+            if container.name.startswith(WORKER_POOL_PREFIX):
+                container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+
+    def reconcile(self, client):
+        # Claimed nodes keep the (immutable) pool label, so only the pool name marks a node as idle
+        running = {c.id for c in client.containers.list(filters={"label": WORKER_POOL_LABEL, "status": "running"})
+                   if worker_node_info(c)[0].startswith(WORKER_POOL_PREFIX)}
+        with self.lock:
+            dead = [entry for entry in self.idle if entry["id"] not in running]
+            if dead:
+                self.idle = deque(entry for entry in self.idle if entry["id"] in running)
+            unused = time.time() - self.last_claim >= self.idle_ttl
+            target = 0 if unused else self.capacity
+            surplus = [self.idle.pop() for _ in range(max(0, len(self.idle) - target))]
+            missing = max(0, target - len(self.idle) - self.starting)
+            self.starting += missing
+
+        for entry in surplus:
+            self._remove_idle(client, entry)
+        if surplus:
+            app.logger.info("Evicted %d idle warm pool nodes", len(surplus))
+        for entry in dead:
+            self._remove_idle(client, entry)
+        if dead:
+            app.logger.info("Dropped %d warm pool nodes that stopped running", len(dead))
+        if not missing:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, min(PROVISION_FAN_OUT, missing)),
+                                thread_name_prefix="pool-fill") as pool:
+            list(pool.map(lambda _: self._start_one(client), range(missing)))
+
+    def _start_one(self, client):
+        name = f"{WORKER_POOL_PREFIX}{uuid.uuid4().hex[:8]}"
+        try:
+            container = client.containers.run(
+                WORKER_IMAGE,
+                detach=True,
+                name=name,
+                hostname=name,
+                # Docker picks a free host port; a fixed one is not known until the node is claimed
+                ports={"22/tcp": None},
+                labels={WORKER_LABEL: "true", WORKER_POOL_LABEL: "true"}
+            )
+            container.reload()
+            port = worker_node_info(container)[1]
+            # Only ready nodes go into the pool, so a claim never waits for sshd
+            if not probe_readiness(client, [(name, port)], source="pool")[0]["ready"]:
+                container.remove(force=True)
+                raise RuntimeError("node never became ready")
+            entry = {"id": container.id, "port": port, "since": time.time()}
+            with self.lock:
+                self.idle.append(entry)
+        except Exception as e:
+            app.logger.warning("Could not start warm pool node %s: %s", name, e)
+        finally:
+            with self.lock:
+                self.starting -= 1
+
+
+worker_pool = WorkerPool(WORKER_POOL_SIZE, WORKER_POOL_IDLE_TTL)
+
+
+@app.route("/ansible/local/worker_pool", methods=["GET", "POST"])
+def worker_pool_status():
+    """Warm pool state as JSON; POST `capacity` to resize it."""
+    if request.method == "POST":
+        try:
+            worker_pool.resize(int(request.form["capacity"]))
+        except (KeyError, ValueError):
+            abort(400)
+        if not wants_json():
+            return redirect(url_for("add_worker_nodes"))
+    return jsonify(worker_pool.status())
+
+
 @app.route("/ansible/local/add_worker_nodes", methods=["GET", "POST"])
 def add_worker_nodes():
-    client = docker.from_env()
+    client = get_docker_client()
+    worker_node_cache.start()
+    # Started from a request, not at import, so the debug reloader's parent process never runs a pool
+    if worker_pool.capacity:
+        worker_pool.start()
     message = ""
-    existing = []
-
-    # Step 1: List all existing worker nodes
-    for container in client.containers.list(all=True):
-        if container.name.startswith("ubuntu-node"):
-            ports = container.attrs['NetworkSettings']['Ports']
-            ssh_port = ports.get("22/tcp", [{}])[0].get("HostPort", "N/A")
-            existing.append((container.name, ssh_port, container.status))
 
-    # Step 2: Handle form actions
+    # Handle form actions
     if request.method == "POST":
         if "create" in request.form:
             try:
                 count = int(request.form["count"])
-                base_port = int(request.form["base_port"])
                 host_group = request.form["host_group"]
-                image = "arunvel1988/ansible_worker_node"
-                created = []
-
-                inventory_path = "inventory.ini"
-                with open(inventory_path, "w") as f:
-                    f.write(f"[{host_group}]\n")
-
-                    for i in range(count):
-                        unique_suffix = str(uuid.uuid4())[:8]
-                        name = f"ubuntu-node{i+1}-{unique_suffix}"
-                        host_port = base_port + i
-
-                        client.containers.run(
-                            image,
-                            detach=True,
-                            name=name,
-                            hostname=name,
-                            ports={"22/tcp": host_port}
-                        )
-                        created.append((name, str(host_port)))
-                        f.write(
-                            f"{name} ansible_host=127.0.0.1 ansible_port={host_port} "
-                            f"ansible_user=arun ansible_password=arun "
-                            f"ansible_python_interpreter=/usr/bin/python3 "
-                            f"ansible_ssh_common_args='-o StrictHostKeyChecking=no'\n"
-                        )
-
-                message += f"✅ Created {len(created)} new worker nodes.<br>"
-                for name, port in created:
-                    message += f"<code>{name}</code> → SSH Port: <strong>{port}</strong><br>"
-
-                return redirect(url_for('add_worker_nodes'))
+                fan_out = int(request.form.get("fan_out") or PROVISION_FAN_OUT)
+                connection = request.form.get("connection", "ssh")
+                if connection not in WORKER_CONNECTIONS:
+                    raise ValueError(f"Unknown connection type: {connection}")
+                over_ssh = connection == "ssh"
+                base_port = int(request.form["base_port"]) if over_ssh else None
+                use_key = over_ssh and "ssh_key" in request.form
+                reuse = "ssh_reuse" in request.form
+                use_pool = "use_pool" in request.form
+                public_key = ensure_worker_ssh_key() if use_key else None
+
+                started = time.time()
+                results = provision_worker_nodes(client, count, base_port, host_group, fan_out, public_key, reuse,
+                                                 use_pool)
+                # Hand the nodes over only once they accept connections
+                probes = probe_readiness(client, [(r["name"], r["port"]) for r in results if r["ok"]])
+                for r, probe in zip([r for r in results if r["ok"]], probes):
+                    if not probe["ready"]:
+                        r.update(ok=False, error=f"not ready after {probe['seconds']:.0f}s: {probe['error']}")
+                    r["ready_seconds"] = probe["seconds"]
+                created = [r for r in results if r["ok"]]
+                failed = [r for r in results if not r["ok"]]
+
+                # The inventory is derived from live containers, so nodes from other operators are kept
+                worker_node_cache.refresh(client)
+                sync_inventory_file(client)
+                if not failed:
+                    message += f"✅ Created {len(created)} new worker nodes in {time.time() - started:.1f}s.<br>"
+                else:
+                    message += f"❌ {len(failed)} of {count} worker nodes failed.<br>"
+
+                for r in results:
+                    if r["ok"]:
+                        target = f"SSH Port: <strong>{r['port']}</strong>" if r["port"] else "docker exec"
+                        source = "warm pool, " if r.get("pooled") else ""
+                        message += (f"✅ <code>{r['name']}</code> → {target} "
+                                    f"({source}{r['seconds']:.1f}s, ready after {r['ready_seconds']:.1f}s)<br>")
+                    else:
+                        message += f"❌ <code>{r['name']}</code> → <code>{r['error']}</code><br>"
 
             except Exception as e:
                 message = f"❌ Error creating worker nodes:<br><code>{e}</code>"
 
         elif "delete" in request.form:
             try:
-                deleted = []
-                for container in client.containers.list(all=True):
-                    if container.name.startswith("ubuntu-node"):
-                        container.remove(force=True)
-                        deleted.append(container.name)
+                results = teardown_worker_nodes(client)
+                deleted = [r["name"] for r in results if r["ok"]]
+                failed = [r for r in results if not r["ok"]]
 
-                # Remove inventory if exists
-                if os.path.exists("inventory.ini"):
-                    os.remove("inventory.ini")
+                worker_node_cache.refresh(client)
+                sync_inventory_file(client)
 
                 message = f"🗑️ Deleted {len(deleted)} worker nodes:<br>" + "<br>".join(deleted)
-                return redirect(url_for('add_worker_nodes'))
+                for r in failed:
+                    message += f"<br>❌ <code>{r['name']}</code> → <code>{r['error']}</code>"
 
             except Exception as e:
                 message = f"❌ Error deleting worker nodes:<br><code>{e}</code>"
 
-    return render_template("add_worker_nodes.html", message=message, existing=existing)
+    # List all existing worker nodes
+    existing = worker_node_cache.snapshot(client)
+
+    with readiness_lock:
+        readiness = {name: r["ready"] for name, r in worker_readiness.items()}
+    return render_template("add_worker_nodes.html", message=message, existing=existing,
+                           fan_out=PROVISION_FAN_OUT, ssh_reuse=SSH_REUSE, pool=worker_pool.status(),
+                           readiness=readiness)
 
 
 @app.route("/ansible/local/add_worker_nodes/run_test_playbook", methods=["GET","POST"])
 def run_test_playbook():
     try:
         playbook_path = "test_playbook.yml"
-        inventory_path = "inventory.ini"
+        # Each run gets its own snapshot of the live inventory so concurrent changes cannot clobber it
+        worker_node_cache.start()
+        inventory_path = write_inventory_snapshot(get_docker_client())
 
         # Create the test playbook file
         with open(playbook_path, "w") as f:
@@ -294,26 +1203,18 @@ def run_test_playbook():
       ansible.builtin.ping:
 """)
 
-        # Run the playbook
-        result = subprocess.run(
+        # Queue the playbook run and send the browser to the job page
+        job_id = submit_job(
             ["ansible-playbook", "-i", inventory_path, playbook_path],
-            capture_output=True,
-            text=True
+            label="test connection playbook",
+            back_url=url_for('add_worker_nodes'),
+            on_complete=lambda job: os.remove(inventory_path),
+            playbook=playbook_path,
+            inventory=inventory_path
         )
-
-        # Format the output for HTML display
-        return f"""
-            <div style='padding:20px;font-family:monospace;background:#f8f9fa;'>
-                <h4>✅ Playbook Execution Output</h4>
-                <pre style='background:#e9ecef;border:1px solid #ccc;padding:10px;'>{result.stdout}</pre>
-                <h4 style='color:red;'>Stderr (if any)</h4>
-                <pre style='background:#fdd;border:1px solid #f99;padding:10px;color:red;'>{result.stderr}</pre>
-                <br>
-                <a href="/ansible/local/add_worker_nodes" class="btn btn-outline-primary">← Back</a>
-                <a href="/ansible/local/playbooks" class="btn btn-outline-primary">← Playbooks</a>
-                <a href="/ansible/local/tower" class="btn btn-outline-primary">← Ansible Tower</a>
-            </div>
-        """
+        if wants_json():
+            return jsonify(job_id=job_id), 202
+        return redirect(url_for('job_status', job_id=job_id))
 
     except Exception as e:
         return f"""
@@ -375,37 +1276,1108 @@ def preview_playbook():
         return f"<pre>❌ Error displaying files:<br>{str(e)}</pre>"
 
 
+######################################## job engine #################################################
+
+# ansible-playbook runs are queued here instead of blocking the request thread.
+# JOB_WORKERS bounds how many playbooks run at the same time.
+JOB_WORKERS = int(os.environ.get("ANSIBLE_UI_JOB_WORKERS", "4"))
+JOB_HISTORY_LIMIT = int(os.environ.get("ANSIBLE_UI_JOB_HISTORY", "200"))
+# Output is spooled to JOBS_DIR; only the last JOB_BUFFER_LINES lines stay in memory for live viewers.
+JOBS_DIR = os.environ.get("ANSIBLE_UI_JOBS_DIR", "./.jobs")
+JOB_BUFFER_LINES = int(os.environ.get("ANSIBLE_UI_JOB_BUFFER_LINES", "2000"))
+# Pages and JSON results carry at most this much of the log; the full file is served from /jobs/<id>/log
+JOB_OUTPUT_TAIL_BYTES = int(os.environ.get("ANSIBLE_UI_JOB_OUTPUT_TAIL", str(256 * 1024)))
+# Playbook jobs also write structured events (one JSON object per line) through this callback plugin
+UI_CALLBACK_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "callback_plugins"))
+UI_CALLBACK_NAME = "ui_events"
+
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="ansible-job")
+jobs = OrderedDict()
+jobs_lock = threading.Lock()
+
+JOB_FINISHED_STATES = ("success", "failed", "cancelled")
+
+
+def submit_job(cmd, label, back_url="/", on_complete=None, playbook=None, inventory=None, profile=False):
+    """Queue a command on the job pool and return its job id immediately.
+
+    Jobs that name a `playbook` are recorded in the run history when they finish;
+    with `profile` their task timing profile is stored alongside.
+    """
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "id": job_id,
+        "label": label,
+        "cmd": cmd,
+        "playbook": playbook,
+        "inventory": inventory,
+        "run_id": None,
+        "profile": profile,
+        "back_url": back_url,
+        "status": "queued",
+        "rc": None,
+        "log_path": os.path.join(JOBS_DIR, f"{job_id}.log"),
+        "events_path": os.path.join(JOBS_DIR, f"{job_id}.events.jsonl") if playbook else None,
+        "event_state": None,
+        "ssh_control_dir": None,
+        "lines": deque(maxlen=JOB_BUFFER_LINES),
+        "line_count": 0,
+        "cond": threading.Condition(),
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "cancel_requested": False,
+        "process": None,
+        "future": None,
+        "on_complete": on_complete,
+    }
+    with jobs_lock:
+        jobs[job_id] = job
+        # Forget the oldest finished jobs once the history limit is reached
+        while len(jobs) > JOB_HISTORY_LIMIT:
+            oldest = next((j for j in jobs.values() if j["status"] in JOB_FINISHED_STATES), None)
+            if oldest is None:
+                break
+            del jobs[oldest["id"]]
+            for path in (oldest["log_path"], oldest["events_path"]):
+                if path and os.path.exists(path):
+                    os.remove(path)
+        job["future"] = job_executor.submit(_run_job, job)
+    return job_id
+
+
+def _append_job_line(job, line, log):
+    log.write(line)
+    with job["cond"]:
+        job["line_count"] += 1
+        job["lines"].append((job["line_count"], line.rstrip("\n")))
+        job["cond"].notify_all()
+
+
+def job_environment(job):
+    """Environment for the child process; playbook jobs get the event callback enabled."""
+    env = dict(os.environ)
+    # Collections installed from the roles page live in COLLECTIONS_DIR, which Ansible does not search by default
+    search_path = env.get("ANSIBLE_COLLECTIONS_PATH") or env.get("ANSIBLE_COLLECTIONS_PATHS") or DEFAULT_COLLECTIONS_PATH
+    env["ANSIBLE_COLLECTIONS_PATH"] = os.pathsep.join([os.path.abspath(COLLECTIONS_DIR), search_path])
+    if job["events_path"]:
+        plugin_dirs = [UI_CALLBACK_DIR] + [p for p in env.get("ANSIBLE_CALLBACK_PLUGINS", "").split(os.pathsep) if p]
+        enabled = [UI_CALLBACK_NAME] + [c for c in env.get("ANSIBLE_CALLBACKS_ENABLED", "").split(",") if c]
+        env["ANSIBLE_CALLBACK_PLUGINS"] = os.pathsep.join(plugin_dirs)
+        env["ANSIBLE_CALLBACKS_ENABLED"] = ",".join(enabled)
+        env["ANSIBLE_UI_EVENTS_FILE"] = os.path.abspath(job["events_path"])
+    if job["ssh_control_dir"]:
+        env["ANSIBLE_PIPELINING"] = "True"
+        env["ANSIBLE_SSH_CONTROL_PATH_DIR"] = job["ssh_control_dir"]
+        env.setdefault("ANSIBLE_SSH_ARGS", f"-C {SSH_REUSE_ARGS}")
+    return env
+
+
+def _run_job(job):
+    with jobs_lock:
+        if job["status"] == "cancelled":
+            return
+        job["status"] = "running"
+        job["started"] = time.time()
+
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    if job["playbook"] and SSH_REUSE:
+        # Per-job ControlPath directory; kept short because unix socket paths are limited to ~100 bytes
+        job["ssh_control_dir"] = tempfile.mkdtemp(prefix="aui-cp-")
+    with open(job["log_path"], "w") as log:
+        try:
+            proc = subprocess.Popen(
+                job["cmd"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                env=job_environment(job)
+            )
+            with jobs_lock:
+                job["process"] = proc
+                cancel = job["cancel_requested"]
+            if cancel:
+                proc.terminate()
+
+            # Read line by line so viewers see output while the playbook is still running
+            for line in proc.stdout:
+                _append_job_line(job, line, log)
+                log.flush()
+            job["rc"] = proc.wait()
+            if job["cancel_requested"]:
+                job["status"] = "cancelled"
+            else:
+                job["status"] = "success" if proc.returncode == 0 else "failed"
+        except Exception as e:
+            _append_job_line(job, f"❌ Error running job: {e}\n", log)
+            job["status"] = "failed"
+        finally:
+            with jobs_lock:
+                job["process"] = None
+                job["finished"] = time.time()
+            if job["ssh_control_dir"]:
+                shutil.rmtree(job["ssh_control_dir"], ignore_errors=True)
+            with job["cond"]:
+                job["cond"].notify_all()
+
+    if job["playbook"]:
+        try:
+            job["run_id"] = record_run(job)
+            if job["profile"]:
+                save_run_profile(job["run_id"], build_profile(job_event_state(job)))
+        except Exception as e:
+            app.logger.warning("Could not record run history for job %s: %s", job["id"], e)
+
+    if job["on_complete"]:
+        try:
+            job["on_complete"](job)
+        except Exception as e:
+            app.logger.warning("on_complete hook failed for job %s: %s", job["id"], e)
+
+
+def cancel_job(job_id):
+    """Cancel a queued job or terminate a running one. Returns False if the job already finished."""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None or job["status"] in JOB_FINISHED_STATES:
+            return False
+        job["cancel_requested"] = True
+        never_ran = job["status"] == "queued" and job["future"].cancel()
+        if never_ran:
+            job["status"] = "cancelled"
+            job["finished"] = time.time()
+            with job["cond"]:
+                job["cond"].notify_all()
+        elif job["process"] is not None:
+            job["process"].terminate()
+    # _run_job will not run for this job, so its cleanup hook has to run here
+    if never_ran and job["on_complete"]:
+        try:
+            job["on_complete"](job)
+        except Exception as e:
+            app.logger.warning("on_complete hook failed for job %s: %s", job["id"], e)
+    return True
+
+
+def read_job_output(job, max_bytes=JOB_OUTPUT_TAIL_BYTES):
+    """Return (last `max_bytes` of the spooled log, number of bytes left out before it)."""
+    try:
+        with open(job["log_path"], "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            skipped = max(0, size - max_bytes)
+            f.seek(skipped)
+            data = f.read()
+    except FileNotFoundError:
+        return "", 0
+    if skipped:
+        # Start on a line boundary rather than mid-line (or mid-character)
+        newline = data.find(b"\n")
+        if newline != -1:
+            skipped += newline + 1
+            data = data[newline + 1:]
+    return data.decode(errors="replace"), skipped
+
+
+def job_summary(job, with_output=False):
+    summary = {k: job[k] for k in ("id", "label", "status", "rc", "created", "started", "finished", "line_count", "run_id", "profile")}
+    summary["cmd"] = " ".join(job["cmd"])
+    if with_output:
+        summary["output"], summary["output_skipped"] = read_job_output(job)
+        summary["log_url"] = url_for("job_log", job_id=job["id"])
+    return summary
+
+
+def stream_job_lines(job, last_seen=0, keepalive=15):
+    """Yield Server-Sent Events for every output line after `last_seen`.
+
+    The generator pulls from the job's ring buffer at the client's pace, so a slow
+    browser never blocks the playbook. A client that falls further behind than the
+    buffer holds gets a `gap` event telling it how many lines were skipped.
+    """
+    cond = job["cond"]
+    while True:
+        with cond:
+            if job["line_count"] <= last_seen and job["status"] not in JOB_FINISHED_STATES:
+                cond.wait(timeout=keepalive)
+            batch = [(n, line) for n, line in job["lines"] if n > last_seen]
+            done = job["status"] in JOB_FINISHED_STATES and job["line_count"] <= (batch[-1][0] if batch else last_seen)
+
+        if not batch and not done:
+            yield ": keepalive\n\n"
+            continue
+
+        if batch and batch[0][0] > last_seen + 1:
+            yield f"event: gap\ndata: {batch[0][0] - last_seen - 1}\n\n"
+        for n, line in batch:
+            yield f"id: {n}\ndata: {line}\n\n"
+            last_seen = n
+
+        if done:
+            yield f"event: end\ndata: {job['status']}\n\n"
+            return
+
+
+def get_job_or_404(job_id):
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+
+def wants_json():
+    if request.args.get("format") == "json":
+        return True
+    return request.accept_mimetypes.best == "application/json"
+
+
+@app.route("/jobs")
+def list_jobs():
+    with jobs_lock:
+        summaries = [job_summary(j) for j in reversed(jobs.values())]
+    return jsonify(jobs=summaries, workers=JOB_WORKERS)
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = get_job_or_404(job_id)
+    if wants_json():
+        return jsonify(job_summary(job))
+    state = job_event_state(job)
+    finished = job["status"] in JOB_FINISHED_STATES
+    # A running job's output arrives over the stream, so only finished pages read the log
+    return render_template("job_status.html", job=job_summary(job, with_output=finished),
+                           back_url=job["back_url"], finished=finished,
+                           hosts=state["hosts"] if state else None)
+
+
+@app.route("/jobs/<job_id>/stream")
+def job_stream(job_id):
+    job = get_job_or_404(job_id)
+    # EventSource sends Last-Event-ID on reconnect; ?from=0 replays the whole buffer
+    last_seen = request.headers.get("Last-Event-ID") or request.args.get("from", "0")
+    try:
+        last_seen = int(last_seen)
+    except ValueError:
+        last_seen = 0
+    return Response(
+        stream_with_context(stream_job_lines(job, last_seen)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.route("/jobs/<job_id>/log")
+def job_log(job_id):
+    """The full spooled output, streamed from disk."""
+    job = get_job_or_404(job_id)
+    if not os.path.exists(job["log_path"]):
+        abort(404)
+    return send_file(os.path.abspath(job["log_path"]), mimetype="text/plain", max_age=0)
+
+
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    get_job_or_404(job_id)
+    cancelled = cancel_job(job_id)
+    if wants_json():
+        return jsonify(id=job_id, cancelled=cancelled)
+    return redirect(url_for("job_status", job_id=job_id))
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = get_job_or_404(job_id)
+    if job["status"] not in JOB_FINISHED_STATES:
+        return jsonify(job_summary(job)), 202
+    return jsonify(job_summary(job, with_output=True))
+
+
+############ structured job events ############
+
+EVENT_RESULT_STATUS = {
+    "runner_on_ok": "ok",
+    "runner_on_failed": "failed",
+    "runner_on_skipped": "skipped",
+    "runner_on_unreachable": "unreachable",
+}
+
+
+def new_event_state():
+    return {"offset": 0, "hosts": {}, "tasks": OrderedDict(), "results": [], "starts": {}, "plays": []}
+
+
+def apply_job_event(state, event):
+    kind = event.get("event")
+    if kind == "play_start":
+        state["plays"].append({"name": event.get("play"), "started": event["time"]})
+    elif kind == "task_start":
+        state["tasks"].setdefault(event["task_uuid"], {
+            "uuid": event["task_uuid"],
+            "name": event.get("task"),
+            "play": event.get("play"),
+            "action": event.get("action"),
+            "started": event["time"],
+            "finished": None,
+            "hosts": {},
+        })
+    elif kind == "runner_on_start":
+        state["starts"][(event["task_uuid"], event["host"])] = event["time"]
+    elif kind in EVENT_RESULT_STATUS:
+        status = EVENT_RESULT_STATUS[kind]
+        if status == "failed" and event.get("ignore_errors"):
+            status = "ignored"
+        host = event["host"]
+        started = state["starts"].pop((event["task_uuid"], host), None)
+        record = {
+            "host": host,
+            "task": event.get("task"),
+            "task_uuid": event["task_uuid"],
+            "play": event.get("play"),
+            "action": event.get("action"),
+            "status": status,
+            "changed": event.get("changed", False),
+            "msg": event.get("msg", ""),
+            "stderr": event.get("stderr", ""),
+            "started": started,
+            "finished": event["time"],
+            "seconds": (event["time"] - started) if started else None,
+        }
+        state["results"].append(record)
+
+        counters = state["hosts"].setdefault(host, dict.fromkeys(("ok", "changed", "failed", "skipped", "unreachable", "ignored"), 0))
+        counters[status] += 1
+        if record["changed"]:
+            counters["changed"] += 1
+
+        task = state["tasks"].get(event["task_uuid"])
+        if task is not None:
+            task["hosts"][host] = status
+            task["finished"] = event["time"]
+
+
+def job_event_state(job):
+    """Parse any new lines of the job's events file and return the up-to-date state.
+
+    Parsing is incremental: only bytes after the last complete line seen are read.
+    """
+    if not job["events_path"]:
+        return None
+    with job["cond"]:
+        state = job["event_state"] or new_event_state()
+        job["event_state"] = state
+        if os.path.exists(job["events_path"]):
+            with open(job["events_path"], "rb") as f:
+                f.seek(state["offset"])
+                data = f.read()
+            end = data.rfind(b"\n") + 1
+            for raw in data[:end].splitlines():
+                try:
+                    apply_job_event(state, json.loads(raw))
+                except (ValueError, KeyError):
+                    continue
+            state["offset"] += end
+        return state
+
+
+@app.route("/jobs/<job_id>/hosts")
+def job_hosts(job_id):
+    job = get_job_or_404(job_id)
+    state = job_event_state(job) or new_event_state()
+    return jsonify(
+        status=job["status"],
+        hosts=state["hosts"],
+        tasks_started=len(state["tasks"]),
+        results=len(state["results"])
+    )
+
+
+@app.route("/jobs/<job_id>/tasks")
+def job_tasks(job_id):
+    job = get_job_or_404(job_id)
+    state = job_event_state(job) or new_event_state()
+    tasks = [
+        {**t, "seconds": (t["finished"] - t["started"]) if t["finished"] else None}
+        for t in state["tasks"].values()
+    ]
+    return jsonify(tasks=tasks)
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """Paginated per-host task results. Filters: host, status (ok/failed/...), task (substring)."""
+    job = get_job_or_404(job_id)
+    state = job_event_state(job) or new_event_state()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 100, type=int), 1), 500)
+
+    results = state["results"]
+    if request.args.get("host"):
+        results = [r for r in results if r["host"] == request.args["host"]]
+    if request.args.get("status"):
+        results = [r for r in results if r["status"] == request.args["status"]]
+    if request.args.get("task"):
+        needle = request.args["task"].lower()
+        results = [r for r in results if needle in (r["task"] or "").lower()]
+
+    start = (page - 1) * per_page
+    return jsonify(
+        events=results[start:start + per_page],
+        page=page,
+        per_page=per_page,
+        total=len(results)
+    )
+
+############ structured job events end ############
+
+
+######################################## job engine end #################################################
+
+
+######################################## run history #################################################
+
+# Every finished playbook job is stored in SQLite with its per-host recap and zlib-compressed output.
+RUN_HISTORY_DB = os.environ.get("ANSIBLE_UI_HISTORY_DB", os.path.join(JOBS_DIR, "run_history.db"))
+RUN_RETENTION_DAYS = int(os.environ.get("ANSIBLE_UI_HISTORY_RETENTION_DAYS", "180"))
+RUN_PRUNE_INTERVAL = 3600
+
+RECAP_RE = re.compile(
+    r"^(?P<host>\S+)\s*:\s*ok=(?P<ok>\d+)\s+changed=(?P<changed>\d+)\s+"
+    r"unreachable=(?P<unreachable>\d+)\s+failed=(?P<failed>\d+)"
+    r"(?:\s+skipped=(?P<skipped>\d+))?(?:\s+rescued=(?P<rescued>\d+))?(?:\s+ignored=(?P<ignored>\d+))?"
+)
+RECAP_FIELDS = ("ok", "changed", "unreachable", "failed", "skipped", "rescued", "ignored")
+
+history_lock = threading.Lock()
+last_prune = 0
+
+
+@contextmanager
+def get_history_db():
+    conn = sqlite3.connect(RUN_HISTORY_DB, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_run_history():
+    os.makedirs(os.path.dirname(RUN_HISTORY_DB) or ".", exist_ok=True)
+    with get_history_db() as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT,
+                playbook TEXT NOT NULL,
+                inventory TEXT,
+                status TEXT,
+                rc INTEGER,
+                started REAL,
+                finished REAL,
+                host_stats TEXT,
+                output BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_runs_playbook ON runs (playbook, id);
+            CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status, id);
+            CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started);
+
+            CREATE TABLE IF NOT EXISTS run_hosts (
+                run_id INTEGER NOT NULL,
+                host TEXT NOT NULL,
+                ok INTEGER, changed INTEGER, unreachable INTEGER, failed INTEGER,
+                skipped INTEGER, rescued INTEGER, ignored INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_run_hosts_host ON run_hosts (host, run_id);
+            CREATE INDEX IF NOT EXISTS idx_run_hosts_run ON run_hosts (run_id);
+        """)
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+        if "profile" not in columns:
+            conn.execute("ALTER TABLE runs ADD COLUMN profile BLOB")
+
+
+def parse_recap(lines):
+    """Return {host: {ok: n, changed: n, ...}} from the PLAY RECAP block of ansible output."""
+    stats = {}
+    in_recap = False
+    for line in lines:
+        if line.startswith("PLAY RECAP"):
+            in_recap = True
+            continue
+        if in_recap:
+            match = RECAP_RE.match(line.strip())
+            if match:
+                stats[match.group("host")] = {f: int(match.group(f) or 0) for f in RECAP_FIELDS}
+    return stats
+
+
+def compress_file(path, chunk_size=64 * 1024):
+    compressor = zlib.compressobj(6)
+    chunks = []
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                chunks.append(compressor.compress(chunk))
+    chunks.append(compressor.flush())
+    return b"".join(chunks)
+
+
+def record_run(job):
+    with open(job["log_path"]) as f:
+        host_stats = parse_recap(f)
+    output = compress_file(job["log_path"])
+
+    with history_lock, get_history_db() as conn:
+        cur = conn.execute(
+            "INSERT INTO runs (job_id, playbook, inventory, status, rc, started, finished, host_stats, output) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job["playbook"], job["inventory"], job["status"], job["rc"],
+             job["started"], job["finished"], json.dumps(host_stats), output)
+        )
+        run_id = cur.lastrowid
+        conn.executemany(
+            f"INSERT INTO run_hosts (run_id, host, {', '.join(RECAP_FIELDS)}) VALUES (?, ?, {', '.join('?' * len(RECAP_FIELDS))})",
+            [(run_id, host, *(counts[f] for f in RECAP_FIELDS)) for host, counts in host_stats.items()]
+        )
+    prune_run_history()
+    return run_id
+
+
+def prune_run_history(force=False):
+    """Drop runs older than RUN_RETENTION_DAYS, at most once per RUN_PRUNE_INTERVAL."""
+    global last_prune
+    now = time.time()
+    if not force and now - last_prune < RUN_PRUNE_INTERVAL:
+        return 0
+    last_prune = now
+    cutoff = now - RUN_RETENTION_DAYS * 86400
+    with history_lock, get_history_db() as conn:
+        conn.execute("DELETE FROM run_hosts WHERE run_id IN (SELECT id FROM runs WHERE started < ?)", (cutoff,))
+        return conn.execute("DELETE FROM runs WHERE started < ?", (cutoff,)).rowcount
+
+
+def run_row_summary(row):
+    return {
+        "id": row["id"],
+        "job_id": row["job_id"],
+        "playbook": row["playbook"],
+        "inventory": row["inventory"],
+        "status": row["status"],
+        "rc": row["rc"],
+        "started": row["started"],
+        "finished": row["finished"],
+        "hosts": json.loads(row["host_stats"] or "{}"),
+    }
+
+
+def get_run_or_404(run_id, columns="*"):
+    with get_history_db() as conn:
+        row = conn.execute(f"SELECT {columns} FROM runs WHERE id = ?", (run_id,)).fetchone()
+    if row is None:
+        abort(404)
+    return row
+
+
+@app.route("/runs")
+def list_runs():
+    """Paginated run history. Filters: playbook, host, status, q (playbook substring), since, until."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 200)
+
+    where, params = [], []
+    if request.args.get("playbook"):
+        where.append("playbook = ?")
+        params.append(request.args["playbook"])
+    if request.args.get("status"):
+        where.append("status = ?")
+        params.append(request.args["status"])
+    if request.args.get("host"):
+        where.append("id IN (SELECT run_id FROM run_hosts WHERE host = ?)")
+        params.append(request.args["host"])
+    if request.args.get("q"):
+        where.append("playbook LIKE ?")
+        params.append(f"%{request.args['q']}%")
+    if request.args.get("since", type=float):
+        where.append("started >= ?")
+        params.append(request.args.get("since", type=float))
+    if request.args.get("until", type=float):
+        where.append("started < ?")
+        params.append(request.args.get("until", type=float))
+
+    sql = "SELECT id, job_id, playbook, inventory, status, rc, started, finished, host_stats FROM runs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Fetch one extra row to know whether another page exists without a COUNT(*)
+    sql += " ORDER BY id DESC LIMIT ? OFFSET ?"
+    params += [per_page + 1, (page - 1) * per_page]
+
+    with get_history_db() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    return jsonify(
+        runs=[run_row_summary(r) for r in rows[:per_page]],
+        page=page,
+        per_page=per_page,
+        has_more=len(rows) > per_page
+    )
+
+
+@app.route("/runs/<int:run_id>")
+def run_detail(run_id):
+    row = get_run_or_404(run_id, "id, job_id, playbook, inventory, status, rc, started, finished, host_stats")
+    return jsonify(run_row_summary(row))
+
+
+@app.route("/runs/<int:run_id>/output")
+def run_output(run_id):
+    row = get_run_or_404(run_id, "output")
+    return Response(zlib.decompress(row["output"]), mimetype="text/plain")
+
+
+############ run profiles ############
+
+PROFILE_SORT_KEYS = {
+    "seconds": lambda t: t["seconds"],
+    "max_host_seconds": lambda t: t["max_host_seconds"],
+    "host_seconds": lambda t: t["host_seconds"],
+    "name": lambda t: t["name"] or "",
+}
+
+
+def build_profile(state):
+    """Turn parsed job events into per-task, per-host and per-play wall-clock timings."""
+    tasks = OrderedDict()
+    hosts = {}
+    for result in state["results"]:
+        task = tasks.setdefault(result["task_uuid"], {
+            "uuid": result["task_uuid"],
+            "name": result["task"],
+            "play": result["play"],
+            "action": result["action"],
+            "started": None,
+            "finished": None,
+            "hosts": {},
+        })
+        started = result["started"] or result["finished"]
+        task["started"] = min(filter(None, (task["started"], started)))
+        task["finished"] = max(filter(None, (task["finished"], result["finished"])))
+        seconds = result["seconds"] or 0.0
+        task["hosts"][result["host"]] = task["hosts"].get(result["host"], 0.0) + seconds
+        hosts[result["host"]] = hosts.get(result["host"], 0.0) + seconds
+
+    task_list = []
+    plays = OrderedDict()
+    for task in tasks.values():
+        task["seconds"] = task["finished"] - task["started"]
+        task["host_seconds"] = sum(task["hosts"].values())
+        task["max_host_seconds"] = max(task["hosts"].values(), default=0.0)
+        task_list.append(task)
+        play = plays.setdefault(task["play"], {"name": task["play"], "started": task["started"], "finished": task["finished"]})
+        play["started"] = min(play["started"], task["started"])
+        play["finished"] = max(play["finished"], task["finished"])
+    for play in plays.values():
+        play["seconds"] = play["finished"] - play["started"]
+
+    return {
+        "tasks": task_list,
+        "hosts": hosts,
+        "plays": list(plays.values()),
+        "seconds": sum(p["seconds"] for p in plays.values()),
+    }
+
+
+def flame_graph(profile, root_name):
+    """Nest play -> task -> host. Node values are summed host-seconds, so children always add up to their parent."""
+    plays = OrderedDict()
+    for task in profile["tasks"]:
+        play = plays.setdefault(task["play"], {"name": task["play"] or "play", "value": 0.0, "children": []})
+        play["children"].append({
+            "name": task["name"],
+            "value": task["host_seconds"],
+            "children": [{"name": host, "value": secs} for host, secs in sorted(task["hosts"].items())],
+        })
+        play["value"] += task["host_seconds"]
+    return {"name": root_name, "value": sum(p["value"] for p in plays.values()), "children": list(plays.values())}
+
+
+def save_run_profile(run_id, profile):
+    with history_lock, get_history_db() as conn:
+        conn.execute("UPDATE runs SET profile = ? WHERE id = ?",
+                     (zlib.compress(json.dumps(profile).encode()), run_id))
+
+
+def load_run_profile(run_id):
+    row = get_run_or_404(run_id, "playbook, profile")
+    if row["profile"] is None:
+        abort(404)
+    return row["playbook"], json.loads(zlib.decompress(row["profile"]))
+
+
+@app.route("/runs/<int:run_id>/profile")
+def run_profile(run_id):
+    """Slowest tasks first. ?sort=seconds|max_host_seconds|host_seconds|name, ?order=asc|desc, ?limit=N"""
+    playbook, profile = load_run_profile(run_id)
+    sort = request.args.get("sort", "seconds")
+    if sort not in PROFILE_SORT_KEYS:
+        sort = "seconds"
+    descending = request.args.get("order", "desc" if sort != "name" else "asc") == "desc"
+    limit = request.args.get("limit", 50, type=int)
+
+    tasks = sorted(profile["tasks"], key=PROFILE_SORT_KEYS[sort], reverse=descending)[:limit]
+    hosts = sorted(profile["hosts"].items(), key=lambda h: h[1], reverse=True)
+    if wants_json():
+        return jsonify(run_id=run_id, playbook=playbook, seconds=profile["seconds"],
+                       plays=profile["plays"], tasks=tasks, hosts=dict(hosts))
+    return render_template("run_profile.html", run_id=run_id, playbook=playbook, profile=profile,
+                           tasks=tasks, hosts=hosts, sort=sort, descending=descending)
+
+
+@app.route("/runs/<int:run_id>/profile/flame")
+def run_profile_flame(run_id):
+    playbook, profile = load_run_profile(run_id)
+    return jsonify(flame_graph(profile, playbook))
+
+############ run profiles end ############
+
+
+init_run_history()
+
+######################################## run history end #################################################
+
+
 ######################################## playbooks #################################################
 
 
 
 PLAYBOOKS_DIR = "./playbooks"
 INVENTORY_FILE = os.path.join(PLAYBOOKS_DIR, "./../inventory.ini")
+CATALOG_POLL_INTERVAL = float(os.environ.get("ANSIBLE_UI_CATALOG_POLL", "2"))
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+
+def count_tasks(tasks):
+    """Count tasks, descending into block/rescue/always sections."""
+    total = 0
+    if not isinstance(tasks, list):
+        return 0
+    for task in tasks:
+        if isinstance(task, dict) and any(k in task for k in ("block", "rescue", "always")):
+            total += sum(count_tasks(task.get(k)) for k in ("block", "rescue", "always"))
+        else:
+            total += 1
+    return total
+
+
+def summarize_playbook(content):
+    plays = []
+    data = yaml.safe_load(content) or []
+    for play in data if isinstance(data, list) else []:
+        if not isinstance(play, dict):
+            continue
+        plays.append({
+            "name": play.get("name") or play.get("import_playbook") or "",
+            "hosts": play.get("hosts", ""),
+            "tasks": sum(count_tasks(play.get(k)) for k in ("pre_tasks", "tasks", "post_tasks")),
+        })
+    return plays
+
+
+class PlaybookCatalog:
+    """In-memory index of the playbooks directory.
+
+    Listing and viewing read from memory. The index is updated per file from inotify
+    events when inotify_simple is installed, otherwise by an mtime-polling thread.
+    """
+
+    def __init__(self, directory, poll_interval=CATALOG_POLL_INTERVAL):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.entries = {}
+        self.names = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._watch, name="playbook-catalog", daemon=True)
+        self.rescan()
+        self.thread.start()
+
+    def _load(self, name, st):
+        path = os.path.join(self.directory, name)
+        entry = {"name": name, "size": st.st_size, "mtime": st.st_mtime, "plays": [], "error": None}
+        try:
+            with open(path, "r") as f:
+                entry["content"] = f.read()
+            entry["plays"] = summarize_playbook(entry["content"])
+        except Exception as e:
+            entry.setdefault("content", "")
+            entry["error"] = str(e)
+        entry["hosts"] = sorted({str(p["hosts"]) for p in entry["plays"] if p["hosts"]})
+        entry["task_count"] = sum(p["tasks"] for p in entry["plays"])
+        return entry
+
+    def _publish(self, entries):
+        names = sorted(entries)
+        with self.lock:
+            self.entries = entries
+            self.names = names
+
+    def rescan(self):
+        """Stat every playbook and re-parse only the ones whose size or mtime changed."""
+        with self.lock:
+            current = dict(self.entries)
+        entries = {}
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith(('.yml', '.yaml')) or not dir_entry.is_file():
+                    continue
+                st = dir_entry.stat()
+                old = current.get(dir_entry.name)
+                if old and old["mtime"] == st.st_mtime and old["size"] == st.st_size:
+                    entries[dir_entry.name] = old
+                else:
+                    entries[dir_entry.name] = self._load(dir_entry.name, st)
+        self._publish(entries)
+
+    def refresh_one(self, name):
+        if not name.endswith(('.yml', '.yaml')):
+            return
+        path = os.path.join(self.directory, name)
+        with self.lock:
+            entries = dict(self.entries)
+        try:
+            st = os.stat(path)
+            if os.path.isfile(path):
+                entries[name] = self._load(name, st)
+            else:
+                entries.pop(name, None)
+        except FileNotFoundError:
+            entries.pop(name, None)
+        self._publish(entries)
+
+    def _watch(self):
+        inotify = None
+        if INotify is not None:
+            try:
+                inotify = INotify()
+                mask = (inotify_flags.CLOSE_WRITE | inotify_flags.CREATE | inotify_flags.DELETE
+                        | inotify_flags.MOVED_FROM | inotify_flags.MOVED_TO)
+                inotify.add_watch(self.directory, mask)
+            except OSError as e:
+                app.logger.warning("inotify unavailable for %s, polling instead: %s", self.directory, e)
+                inotify = None
+        if inotify is not None:
+            try:
+                self.rescan()
+            except Exception:
+                app.logger.exception("Could not rescan %s", self.directory)
+            while True:
+                try:
+                    for event in inotify.read():
+                        self.refresh_one(event.name)
+                except Exception:
+                    app.logger.exception("Could not refresh playbook catalog for %s", self.directory)
+                    time.sleep(self.poll_interval)
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.rescan()
+            except Exception:
+                app.logger.exception("Could not rescan %s", self.directory)
+
+    def list(self):
+        with self.lock:
+            return [self.entries[n] for n in self.names]
+
+    def get(self, name):
+        with self.lock:
+            return self.entries.get(name)
+
+
+playbook_catalog = PlaybookCatalog(PLAYBOOKS_DIR)
+
 
 @app.route('/ansible/local/playbooks', methods=['GET', 'POST'])
 def ansible_local_playbooks():
+    playbook_catalog.start()
+
     # Playbook run
     if request.method == 'POST':
         selected_playbook = request.form.get('playbook')
-        if selected_playbook:
+        if selected_playbook and playbook_catalog.get(selected_playbook):
             playbook_path = os.path.join(PLAYBOOKS_DIR, selected_playbook)
-            try:
-                result = subprocess.run(
-                    ['ansible-playbook', '-i', INVENTORY_FILE, playbook_path],
-                    check=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True
-                )
-                return render_template("playbook_output.html", output=result.stdout)
-            except subprocess.CalledProcessError as e:
-                return render_template("playbook_output.html", output=e.stdout)
+            job_id = submit_job(
+                ['ansible-playbook', '-i', INVENTORY_FILE, playbook_path],
+                label=selected_playbook,
+                back_url=url_for('ansible_local_playbooks'),
+                playbook=selected_playbook,
+                inventory=INVENTORY_FILE,
+                profile='profile' in request.form
+            )
+            if wants_json():
+                return jsonify(job_id=job_id), 202
+            return redirect(url_for('job_status', job_id=job_id))
 
     # List playbooks
-    playbooks = [f for f in os.listdir(PLAYBOOKS_DIR)
-                 if f.endswith(('.yml', '.yaml')) and os.path.isfile(os.path.join(PLAYBOOKS_DIR, f))]
-    
-    return render_template('playbooks_list.html', playbooks=playbooks)
+    entries = playbook_catalog.list()
+    playbooks = [e["name"] for e in entries]
+
+    return render_template('playbooks_list.html', playbooks=playbooks,
+                           catalog={e["name"]: e for e in entries})
+
+
+@app.route('/ansible/local/playbooks/catalog')
+def playbook_catalog_json():
+    playbook_catalog.start()
+    return jsonify([
+        {k: e[k] for k in ("name", "size", "mtime", "plays", "hosts", "task_count", "error")}
+        for e in playbook_catalog.list()
+    ])
+
+
+############ fan-out runs ############
+
+# A fan-out run launches one ansible-playbook per shard (inventory file or host pattern).
+# Shards are ordinary jobs, so JOB_WORKERS caps them together with every other run.
+FANOUT_DEFAULT_FORKS = int(os.environ.get("ANSIBLE_UI_FANOUT_FORKS", "10"))
+LIMIT_PATTERN_RE = re.compile(r"^[\w.\-:*!&,\[\]]+$")
+
+fanouts = OrderedDict()
+fanouts_lock = threading.Lock()
+
+
+def fanout_shard_command(playbook_path, target, forks):
+    """Build the ansible-playbook command for one shard, or raise ValueError for a bad target."""
+    cmd = ['ansible-playbook', '--forks', str(forks)]
+    if target.endswith(('.ini', '.yml', '.yaml', '.json')) or os.sep in target:
+        inventory = os.path.realpath(target)
+        if not inventory.startswith(os.getcwd() + os.sep) or not os.path.isfile(inventory):
+            raise ValueError(f"Inventory not found: {target}")
+        cmd += ['-i', target]
+    elif LIMIT_PATTERN_RE.match(target):
+        cmd += ['-i', INVENTORY_FILE, '--limit', target]
+    else:
+        raise ValueError(f"Invalid host pattern: {target}")
+    return cmd + [playbook_path]
+
+
+def shard_recap(job):
+    """Host recap of a finished shard: the host_stats already in run history, else parsed from its log."""
+    if job["run_id"]:
+        with get_history_db() as conn:
+            row = conn.execute("SELECT host_stats FROM runs WHERE id = ?", (job["run_id"],)).fetchone()
+        if row is not None:
+            return json.loads(row["host_stats"] or "{}")
+    if not os.path.exists(job["log_path"]):
+        return {}
+    with open(job["log_path"]) as f:
+        return parse_recap(f)
+
+
+def fanout_report(fanout):
+    """Merge the shards of a fan-out run into one status, host recap and timing report."""
+    with jobs_lock:
+        shard_jobs = [(shard, jobs.get(shard["job_id"])) for shard in fanout["shards"]]
+
+    shards, hosts = [], {}
+    totals = dict.fromkeys(RECAP_FIELDS, 0)
+    for shard, job in shard_jobs:
+        status = job["status"] if job else "expired"
+        shards.append({
+            "target": shard["target"],
+            "job_id": shard["job_id"],
+            "status": status,
+            "rc": job["rc"] if job else None,
+            "seconds": (job["finished"] - job["started"]) if job and job["finished"] and job["started"] else None,
+        })
+        if job and status in JOB_FINISHED_STATES and "recap" not in shard:
+            # A finished shard's recap never changes, so it is read once rather than on every poll
+            shard["recap"] = shard_recap(job)
+        for host, counts in shard.get("recap", {}).items():
+            # A host in several shards gets the sum of its counts, matching the totals
+            merged = hosts.setdefault(host, {**dict.fromkeys(RECAP_FIELDS, 0), "shards": []})
+            merged["shards"].append(shard["target"])
+            for field in RECAP_FIELDS:
+                merged[field] += counts[field]
+                totals[field] += counts[field]
+
+    statuses = {s["status"] for s in shards}
+    if statuses - set(JOB_FINISHED_STATES) - {"expired"}:
+        overall = "running"
+    elif statuses <= {"success"}:
+        overall = "success"
+    else:
+        overall = "failed"
+
+    started = [j["started"] for _, j in shard_jobs if j and j["started"]]
+    finished = [j["finished"] for _, j in shard_jobs if j and j["finished"]]
+    return {
+        "id": fanout["id"],
+        "playbook": fanout["playbook"],
+        "forks": fanout["forks"],
+        "status": overall,
+        "wall_seconds": (max(finished) - min(started)) if overall != "running" and started and finished else None,
+        "shards": shards,
+        "hosts": hosts,
+        "totals": totals,
+    }
+
+
+@app.route('/ansible/local/playbooks/fanout', methods=['POST'])
+def fanout_run():
+    playbook_catalog.start()
+    playbook = request.form.get('playbook', '')
+    targets = [t.strip() for t in request.form.get('targets', '').replace(',', '\n').splitlines() if t.strip()]
+    forks = request.form.get('forks', FANOUT_DEFAULT_FORKS, type=int)
+
+    if not playbook_catalog.get(playbook) or not targets or forks < 1:
+        return jsonify(error="A known playbook, at least one target and forks >= 1 are required."), 400
+
+    playbook_path = os.path.join(PLAYBOOKS_DIR, playbook)
+    try:
+        commands = [(t, fanout_shard_command(playbook_path, t, forks)) for t in targets]
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    fanout_id = uuid.uuid4().hex[:12]
+    back_url = url_for('fanout_status', fanout_id=fanout_id)
+    shards = [
+        {"target": target, "job_id": submit_job(cmd, label=f"{playbook} [{target}]", back_url=back_url,
+                                                playbook=playbook, inventory=target)}
+        for target, cmd in commands
+    ]
+    with fanouts_lock:
+        fanouts[fanout_id] = {"id": fanout_id, "playbook": playbook, "forks": forks, "shards": shards}
+        while len(fanouts) > JOB_HISTORY_LIMIT:
+            fanouts.popitem(last=False)
+
+    if wants_json():
+        return jsonify(fanout_id=fanout_id, shards=shards), 202
+    return redirect(back_url)
+
+
+@app.route('/ansible/local/playbooks/fanout/<fanout_id>')
+def fanout_status(fanout_id):
+    with fanouts_lock:
+        fanout = fanouts.get(fanout_id)
+    if fanout is None:
+        abort(404)
+    report = fanout_report(fanout)
+    if wants_json():
+        return jsonify(report)
+    return render_template('fanout_report.html', report=report)
+
+############ fan-out runs end ############
 
 
 from flask import Flask, render_template, request, redirect, url_for
@@ -416,23 +2388,371 @@ import subprocess
 @app.route('/ansible/local/playbooks/view/<playbook_name>')
 def view_playbook(playbook_name):
     safe_name = secure_filename(playbook_name)
-    playbook_path = os.path.join(PLAYBOOKS_DIR, safe_name)
+    playbook_catalog.start()
+    entry = playbook_catalog.get(safe_name)
 
-    if not os.path.exists(playbook_path):
+    if entry is None:
         return f"<pre>Playbook not found: {safe_name}</pre>"
 
-    try:
-        with open(playbook_path, 'r') as f:
-            content = f.read()
-        return render_template('playbook_view.html', playbook_name=safe_name, content=content)
-    except Exception as e:
-        return f"<pre>Could not read playbook: {e}</pre>"
+    if entry["error"] and not entry["content"]:
+        return f"<pre>Could not read playbook: {entry['error']}</pre>"
+    return render_template('playbook_view.html', playbook_name=safe_name, content=entry["content"])
 
 
 
 ######################################## playbooks end  #################################################
 
 
+######################################## navigator artifacts #################################################
+
+# Where ansible-navigator artifact files (<playbook>-artifact-<timestamp>.json) are looked for
+ARTIFACT_DIRS = os.environ.get("ANSIBLE_UI_ARTIFACT_DIRS", os.pathsep.join(["./docs/my_first_ee", PLAYBOOKS_DIR]))
+ARTIFACT_INDEX_DIR = os.path.join(JOBS_DIR, "artifact_index")
+ARTIFACT_CHUNK_SIZE = 1024 * 1024
+# Larger play/root values (the tasks list, stdout, settings) are never read into memory
+ARTIFACT_MAX_FIELD_BYTES = 64 * 1024
+ARTIFACT_ROOT_FIELDS = ("status", "version")
+ARTIFACT_PLAY_FIELDS = ("name", "pattern", "uuid", "playbook")
+ARTIFACT_TOKEN_RE = re.compile(rb'["{}\[\]:,]')
+ARTIFACT_STRING_RE = re.compile(rb'["\\]')
+
+artifact_index_locks = {}
+artifact_index_locks_lock = threading.Lock()
+
+
+def artifact_role(stack):
+    """What the container just opened is: a play, a task, or None for anything else."""
+    if len(stack) == 3 and stack[0][1] == "plays" and stack[2][0] == "o":
+        return "play"
+    if len(stack) == 5 and stack[0][1] == "plays" and stack[2][1] == "tasks" and stack[4][0] == "o":
+        return "task"
+    return None
+
+
+def iter_artifact_offsets(f, chunk_size=ARTIFACT_CHUNK_SIZE):
+    """Scan an artifact file in chunks and yield byte ranges instead of parsed values.
+
+    Events: ("root_field"|"play_field", key, start, end), ("play_start", start),
+    ("play_end", start, end), ("task", start, end) and ("stdout", start, end). Only one
+    chunk is held in memory; string contents are skipped with a regex search.
+    """
+    stack = []  # [kind, current key, value start, container start] per open container
+    in_string = is_key = False
+    skip = 0
+    key_parts = []
+    string_start = base = 0
+
+    def field_end(offset):
+        top = stack[-1]
+        if top[0] == "o" and top[2] is not None:
+            if len(stack) == 1:
+                yield "root_field", top[1], top[2], offset
+            elif artifact_role(stack) == "play":
+                yield "play_field", top[1], top[2], offset
+
+    while chunk := f.read(chunk_size):
+        n = len(chunk)
+        pos, skip = min(skip, n), max(0, skip - n)
+        while pos < n:
+            if in_string:
+                match = ARTIFACT_STRING_RE.search(chunk, pos)
+                if match is None:
+                    if is_key:
+                        key_parts.append(chunk[pos:])
+                    break
+                i = match.start()
+                if chunk[i] == 0x5C:  # backslash: the next byte is escaped
+                    if is_key:
+                        key_parts.append(chunk[pos:i + 2])
+                    pos = i + 2
+                    skip = max(0, pos - n)
+                    continue
+                in_string = False
+                if is_key:
+                    key_parts.append(chunk[pos:i])
+                    stack[-1][1] = b"".join(key_parts).decode("utf-8", "replace")
+                    is_key = False
+                elif len(stack) == 2 and stack[0][1] == "stdout":
+                    yield "stdout", string_start, base + i + 1
+                pos = i + 1
+                continue
+
+            match = ARTIFACT_TOKEN_RE.search(chunk, pos)
+            if match is None:
+                break
+            i = match.start()
+            char, offset, pos = chunk[i], base + i, i + 1
+            if char == 0x22:  # "
+                in_string, string_start = True, offset
+                # In an object with no ':' seen yet, a string is the next key
+                if stack and stack[-1][0] == "o" and stack[-1][2] is None:
+                    is_key, key_parts = True, []
+            elif char == 0x3A:  # :
+                stack[-1][2] = offset + 1
+            elif char == 0x2C:  # ,
+                if stack[-1][0] == "o":
+                    yield from field_end(offset)
+                    stack[-1][1] = stack[-1][2] = None
+            elif char in (0x7B, 0x5B):  # { [
+                stack.append(["o" if char == 0x7B else "a", None, None, offset])
+                if artifact_role(stack) == "play":
+                    yield "play_start", offset
+            else:  # } ]
+                if char == 0x7D:
+                    yield from field_end(offset)
+                role = artifact_role(stack)
+                start = stack.pop()[3]
+                if role == "task":
+                    yield "task", start, offset + 1
+                elif role == "play":
+                    yield "play_end", start, offset + 1
+        base += n
+
+
+def read_artifact_value(f, start, end):
+    f.seek(start)
+    return json.loads(f.read(end - start))
+
+
+def artifact_task_row(play_id, task, start, end):
+    res = task.get("res") if isinstance(task.get("res"), dict) else {}
+    try:
+        duration = float(task.get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    return (
+        play_id,
+        task.get("__number"),
+        task.get("task") or task.get("__task"),
+        task.get("resolved_action") or task.get("task_action"),
+        task.get("host") or task.get("__host"),
+        str(task.get("__result") or ("Failed" if task.get("failed") else "Ok")).lower(),
+        int(bool(res.get("changed", task.get("__changed")))),
+        duration,
+        task.get("start"),
+        task.get("end"),
+        start,
+        end - start,
+    )
+
+
+def build_artifact_index(path, db_path):
+    """Stream `path` once and write its SQLite index to `db_path` (atomically replaced)."""
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    tmp_path = f"{db_path}.{uuid.uuid4().hex[:8]}.tmp"
+    stat = os.stat(path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE plays (id INTEGER PRIMARY KEY, name TEXT, pattern TEXT, uuid TEXT, playbook TEXT,
+                                task_count INTEGER, offset INTEGER, length INTEGER);
+            CREATE TABLE tasks (id INTEGER PRIMARY KEY, play_id INTEGER, number INTEGER, name TEXT, action TEXT,
+                                host TEXT, result TEXT, changed INTEGER, duration REAL, start TEXT, end TEXT,
+                                offset INTEGER, length INTEGER);
+            CREATE TABLE stdout (line INTEGER PRIMARY KEY, offset INTEGER, length INTEGER);
+        """)
+        meta = {"source": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        play, tasks, stdout = None, [], []
+        with open(path, "rb") as scan, open(path, "rb") as reader:
+            for event in iter_artifact_offsets(scan):
+                kind = event[0]
+                if kind in ("root_field", "play_field"):
+                    _, key, start, end = event
+                    wanted = ARTIFACT_ROOT_FIELDS if kind == "root_field" else ARTIFACT_PLAY_FIELDS
+                    if key in wanted and end - start <= ARTIFACT_MAX_FIELD_BYTES:
+                        (meta if kind == "root_field" else play)[key] = read_artifact_value(reader, start, end)
+                elif kind == "play_start":
+                    play = {"id": (play or {}).get("id", 0) + 1, "task_count": 0}
+                elif kind == "task":
+                    tasks.append(artifact_task_row(play["id"], read_artifact_value(reader, *event[1:]), *event[1:]))
+                    play["task_count"] += 1
+                elif kind == "play_end":
+                    conn.execute(
+                        "INSERT INTO plays VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (play["id"], play.get("name"), play.get("pattern"), play.get("uuid"), play.get("playbook"),
+                         play["task_count"], event[1], event[2] - event[1])
+                    )
+                elif kind == "stdout":
+                    stdout.append((event[1], event[2] - event[1]))
+
+                if len(tasks) >= 500:
+                    conn.executemany("INSERT INTO tasks (play_id, number, name, action, host, result, changed, "
+                                     "duration, start, end, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     tasks)
+                    tasks = []
+                if len(stdout) >= 5000:
+                    conn.executemany("INSERT INTO stdout (offset, length) VALUES (?, ?)", stdout)
+                    stdout = []
+
+        conn.executemany("INSERT INTO tasks (play_id, number, name, action, host, result, changed, "
+                         "duration, start, end, offset, length) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", tasks)
+        conn.executemany("INSERT INTO stdout (offset, length) VALUES (?, ?)", stdout)
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+        conn.executescript("""
+            CREATE INDEX tasks_host ON tasks (host);
+            CREATE INDEX tasks_result ON tasks (result);
+            CREATE INDEX tasks_play ON tasks (play_id);
+        """)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+
+
+@contextmanager
+def get_artifact_db(db_path):
+    conn = sqlite3.connect(db_path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def artifact_index_is_fresh(path, db_path):
+    if not os.path.exists(db_path):
+        return False
+    stat = os.stat(path)
+    try:
+        with get_artifact_db(db_path) as conn:
+            meta = {r["key"]: json.loads(r["value"]) for r in conn.execute("SELECT key, value FROM meta")}
+    except sqlite3.Error:
+        return False
+    return meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns
+
+
+def get_artifact_index(path):
+    """Return the index database for an artifact, (re)building it if the file changed."""
+    db_path = os.path.join(ARTIFACT_INDEX_DIR,
+                           hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16] + ".db")
+    with artifact_index_locks_lock:
+        lock = artifact_index_locks.setdefault(db_path, threading.Lock())
+    with lock:
+        if not artifact_index_is_fresh(path, db_path):
+            started = time.time()
+            build_artifact_index(path, db_path)
+            app.logger.info("Indexed %s (%d bytes) in %.2fs", path, os.path.getsize(path), time.time() - started)
+    return db_path
+
+
+def find_artifacts():
+    found = {}
+    for directory in ARTIFACT_DIRS.split(os.pathsep):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file() and "-artifact-" in entry.name and entry.name.endswith(".json"):
+                found.setdefault(entry.name, entry)
+    return found
+
+
+def get_artifact_or_404(name):
+    entry = find_artifacts().get(name)
+    if entry is None:
+        abort(404)
+    return entry.path
+
+
+@app.route("/ansible/artifacts")
+def list_artifacts():
+    artifacts = []
+    for name, entry in sorted(find_artifacts().items(), key=lambda item: item[1].stat().st_mtime, reverse=True):
+        stat = entry.stat()
+        artifacts.append({"name": name, "size": stat.st_size, "modified": stat.st_mtime})
+    if wants_json():
+        return jsonify(artifacts=artifacts)
+    return render_template("artifacts.html", artifacts=artifacts, artifact=None)
+
+
+@app.route("/ansible/artifacts/<name>")
+def view_artifact(name):
+    """Index summary plus one page of tasks. Filters: play, host, result, q (task name substring)."""
+    db_path = get_artifact_index(get_artifact_or_404(name))
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", 50, type=int), 1), 500)
+
+    where, params = [], []
+    if request.args.get("play", type=int):
+        where.append("play_id = ?")
+        params.append(request.args.get("play", type=int))
+    if request.args.get("host"):
+        where.append("host = ?")
+        params.append(request.args["host"])
+    if request.args.get("result"):
+        where.append("result = ?")
+        params.append(request.args["result"].lower())
+    if request.args.get("q"):
+        where.append("name LIKE ?")
+        params.append(f"%{request.args['q']}%")
+
+    sql = ("SELECT id, play_id, number, name, action, host, result, changed, duration, start, end, length "
+           "FROM tasks")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    # Fetch one extra row to know whether another page exists without a COUNT(*)
+    sql += " ORDER BY id LIMIT ? OFFSET ?"
+    params += [per_page + 1, (page - 1) * per_page]
+
+    with get_artifact_db(db_path) as conn:
+        meta = {r["key"]: json.loads(r["value"]) for r in conn.execute("SELECT key, value FROM meta")}
+        plays = [dict(r) for r in conn.execute("SELECT id, name, pattern, uuid, playbook, task_count FROM plays")]
+        hosts = {}
+        for r in conn.execute("SELECT host, result, COUNT(*) AS n FROM tasks GROUP BY host, result"):
+            hosts.setdefault(r["host"], {})[r["result"]] = r["n"]
+        stdout_lines = conn.execute("SELECT COUNT(*) FROM stdout").fetchone()[0]
+        rows = [dict(r) for r in conn.execute(sql, params)]
+
+    artifact = {
+        "name": name,
+        "status": meta.get("status"),
+        "version": meta.get("version"),
+        "size": meta.get("size"),
+        "plays": plays,
+        "hosts": hosts,
+        "stdout_lines": stdout_lines,
+        "tasks": rows[:per_page],
+        "page": page,
+        "per_page": per_page,
+        "has_more": len(rows) > per_page,
+    }
+    if wants_json():
+        return jsonify(artifact)
+    return render_template("artifacts.html", artifact=artifact, artifacts=None, filters=request.args)
+
+
+@app.route("/ansible/artifacts/<name>/tasks/<int:task_id>")
+def artifact_task(name, task_id):
+    """One task result, read straight from its byte range in the artifact."""
+    path = get_artifact_or_404(name)
+    with get_artifact_db(get_artifact_index(path)) as conn:
+        row = conn.execute("SELECT offset, length FROM tasks WHERE id = ?", (task_id,)).fetchone()
+    if row is None:
+        abort(404)
+    with open(path, "rb") as f:
+        f.seek(row["offset"])
+        return Response(f.read(row["length"]), mimetype="application/json")
+
+
+@app.route("/ansible/artifacts/<name>/stdout")
+def artifact_stdout(name):
+    """A window of the run's stdout lines: ?offset=<first line>&limit=<count>."""
+    path = get_artifact_or_404(name)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 200, type=int), 1), 2000)
+    with get_artifact_db(get_artifact_index(path)) as conn:
+        rows = conn.execute("SELECT offset, length FROM stdout ORDER BY line LIMIT ? OFFSET ?",
+                            (limit + 1, offset)).fetchall()
+    lines = []
+    with open(path, "rb") as f:
+        for row in rows[:limit]:
+            lines.append(read_artifact_value(f, row["offset"], row["offset"] + row["length"]))
+    return jsonify(lines=lines, offset=offset, limit=limit, has_more=len(rows) > limit)
+
+######################################## navigator artifacts end #################################################
+
+
+
 
 ######################### advanced playbook start #####################################################
 
@@ -445,16 +2765,9 @@ ADV_OUTPUT_FILE = os.path.join(ADVANCED_PLAYBOOKS_DIR, "advanced_playbook_output
 ADV_README_FILE = os.path.join(ADVANCED_PLAYBOOKS_DIR, "README.md")
 
 
-def get_directory_tree(path):
-    tree = ""
-    for root, dirs, files in os.walk(path):
-        level = root.replace(path, "").count(os.sep)
-        indent = "│   " * level + "├── "
-        tree += f"{indent}{os.path.basename(root)}/\n"
-        subindent = "│   " * (level + 1) + "├── "
-        for f in files:
-            tree += f"{subindent}{f}\n"
-    return tree
+def save_advanced_output(job):
+    if os.path.exists(job["log_path"]):
+        shutil.copyfile(job["log_path"], ADV_OUTPUT_FILE)
 
 
 @app.route('/ansible/local/playbooks/advanced-playbooks', methods=['GET', 'POST'])
@@ -465,20 +2778,18 @@ def view_advanced_playbook():
 
     if request.method == 'POST':
         if 'run_playbook' in request.form:
-            try:
-                result = subprocess.run(
-                    ['ansible-playbook', '-i', ADV_INVENTORY_FILE, ADV_PLAYBOOK_FILE],
-                   
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
-                    check=True
-                )
-                with open(ADV_OUTPUT_FILE, 'w') as f:
-                    f.write(result.stdout)
-                output = result.stdout
-            except subprocess.CalledProcessError as e:
-                output = e.stdout
+            job_id = submit_job(
+                ['ansible-playbook', '-i', ADV_INVENTORY_FILE, ADV_PLAYBOOK_FILE],
+                label=os.path.basename(ADV_PLAYBOOK_FILE),
+                back_url=url_for('view_advanced_playbook'),
+                on_complete=save_advanced_output,
+                playbook=ADV_PLAYBOOK_FILE,
+                inventory=ADV_INVENTORY_FILE,
+                profile='profile' in request.form
+            )
+            if wants_json():
+                return jsonify(job_id=job_id), 202
+            return redirect(url_for('job_status', job_id=job_id))
 
         elif 'show_tree' in request.form:
             dir_tree = get_directory_tree(ADVANCED_PLAYBOOKS_DIR)
@@ -504,16 +2815,416 @@ ROLES_DIR = "./roles"
 INVENTORY_FILE = "./inventory.ini"
 ROLE_PLAYBOOK_FILE = "./roles/role_playbook.yml"
 
-def get_directory_tree(path):
-    tree = ""
-    for root, dirs, files in os.walk(path):
-        level = root.replace(path, "").count(os.sep)
-        indent = "│   " * level + "├── "
-        tree += f"{indent}{os.path.basename(root)}/\n"
-        subindent = "│   " * (level + 1) + "├── "
-        for f in files:
-            tree += f"{subindent}{f}\n"
-    return tree
+
+################### directory tree ###################
+
+# Directories the tree views and /ansible/local/tree/<root> may browse
+TREE_ROOTS = {"roles": ROLES_DIR, "advanced-playbooks": ADVANCED_PLAYBOOKS_DIR}
+TREE_MAX_DEPTH = int(os.environ.get("ANSIBLE_UI_TREE_DEPTH", "4"))
+TREE_MAX_ENTRIES = int(os.environ.get("ANSIBLE_UI_TREE_ENTRIES", "1000"))
+TREE_CACHE_SIZE = 1024
+
+tree_cache = OrderedDict()
+tree_cache_lock = threading.Lock()
+
+
+def list_directory(path):
+    """Return the sorted entries of one directory, cached until the directory's mtime changes."""
+    mtime = os.stat(path).st_mtime_ns
+    with tree_cache_lock:
+        cached = tree_cache.get(path)
+        if cached and cached[0] == mtime:
+            tree_cache.move_to_end(path)
+            return cached[1]
+
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            is_dir = entry.is_dir(follow_symlinks=False)
+            entries.append({"name": entry.name, "type": "dir" if is_dir else "file"})
+    entries.sort(key=lambda e: (e["type"] != "file", e["name"]))
+
+    with tree_cache_lock:
+        tree_cache[path] = (mtime, entries)
+        while len(tree_cache) > TREE_CACHE_SIZE:
+            tree_cache.popitem(last=False)
+    return entries
+
+
+def get_directory_tree(path, max_depth=TREE_MAX_DEPTH, max_entries=TREE_MAX_ENTRIES):
+    """Render a text tree (files first, then sub-directories) bounded by depth and line count."""
+    lines = []
+    truncated = False
+    stack = [(path, 0)]
+    while stack:
+        current, level = stack.pop()
+        if len(lines) >= max_entries:
+            truncated = True
+            break
+        lines.append(f"{'│   ' * level}├── {os.path.basename(current.rstrip(os.sep)) or current}/")
+        try:
+            entries = list_directory(current)
+        except OSError as e:
+            lines.append(f"{'│   ' * (level + 1)}├── ⚠️ {e.strerror}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry["type"] == "dir":
+                subdirs.append(os.path.join(current, entry["name"]))
+            elif len(lines) < max_entries:
+                lines.append(f"{'│   ' * (level + 1)}├── {entry['name']}")
+            else:
+                truncated = True
+        if level + 1 > max_depth:
+            if subdirs:
+                lines.append(f"{'│   ' * (level + 1)}├── … {len(subdirs)} more directories")
+            continue
+        stack.extend((d, level + 1) for d in reversed(subdirs))
+    if truncated:
+        lines.append(f"… truncated after {max_entries} entries")
+    return "\n".join(lines) + "\n"
+
+
+def resolve_tree_path(root_key, rel_path):
+    root = TREE_ROOTS.get(root_key)
+    if root is None:
+        abort(404)
+    root = os.path.realpath(root)
+    target = os.path.realpath(os.path.join(root, rel_path))
+    if target != root and not target.startswith(root + os.sep):
+        abort(400)
+    if not os.path.isdir(target):
+        abort(404)
+    return target
+
+
+@app.route('/ansible/local/tree/<root_key>')
+def directory_tree_api(root_key):
+    """One directory level as paginated JSON; expand a child by passing its path back in ?path=."""
+    rel_path = request.args.get("path", "")
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = min(max(request.args.get("limit", 200, type=int), 1), TREE_MAX_ENTRIES)
+
+    entries = list_directory(resolve_tree_path(root_key, rel_path))
+    page = [
+        {**e, "path": os.path.join(rel_path, e["name"]) if rel_path else e["name"]}
+        for e in entries[offset:offset + limit]
+    ]
+    return jsonify(
+        root=root_key,
+        path=rel_path,
+        entries=page,
+        total=len(entries),
+        offset=offset,
+        limit=limit,
+        has_more=offset + limit < len(entries)
+    )
+
+################### directory tree end ###################
+
+################### galaxy install cache ###################
+
+COLLECTIONS_DIR = "./collections"
+# Ansible's own default, kept after COLLECTIONS_DIR when no search path is configured
+DEFAULT_COLLECTIONS_PATH = os.pathsep.join(["~/.ansible/collections", "/usr/share/ansible/collections"])
+# Downloaded role/collection tarballs, stored once per content hash and indexed by name@version
+GALAXY_CACHE_DIR = os.environ.get("ANSIBLE_UI_GALAXY_CACHE", "./.galaxy_cache")
+# Local directory or http(s) URL holding <name>-<version>.tar.gz artifacts (e.g. a copy of a cache)
+GALAXY_SOURCE = os.environ.get("ANSIBLE_UI_GALAXY_SOURCE", "")
+# Never contact Galaxy; only the cache and GALAXY_SOURCE are used
+GALAXY_OFFLINE = os.environ.get("ANSIBLE_UI_GALAXY_OFFLINE", "0") == "1"
+GALAXY_WORKERS = int(os.environ.get("ANSIBLE_UI_GALAXY_WORKERS", "4"))
+COLLECTION_TARBALL_RE = re.compile(r"^(?P<ns>[a-z0-9_]+)-(?P<name>[a-z0-9_]+)-(?P<version>\d[^-]*)\.tar\.gz$")
+
+galaxy_index_lock = threading.Lock()
+# Parallel installs can share dependencies; swapping a role directory in is serialised
+role_swap_lock = threading.Lock()
+
+
+# Collection `type`s that are not fetched from a Galaxy server
+COLLECTION_SCM_TYPES = ("git", "url", "file", "dir", "subdirs")
+
+
+def role_name_from_src(src):
+    """Name ansible-galaxy installs a role under when only `src` is given (see repo_url_to_role_name)."""
+    if "://" not in src and "@" not in src:
+        return src
+    name = src.rstrip("/").split("/")[-1]
+    for suffix in (".git", ".tar.gz"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+def requirement_is_scm(kind, spec):
+    """True for SCM/URL/path sources, which are installed as-is and never cached."""
+    if kind == "collection":
+        return spec.get("type") in COLLECTION_SCM_TYPES
+    src = str(spec.get("src") or spec.get("name") or "")
+    return bool(spec.get("scm")) or "://" in src or "+" in src.split("/")[0] or src.endswith((".git", ".tar.gz"))
+
+
+def parse_requirements(content):
+    """Normalise requirements.yml (a role list, or {roles, collections}) into requirement dicts.
+
+    Each dict keeps the original entry under "spec", which is what gets handed to ansible-galaxy.
+    """
+    data = yaml.safe_load(content) or {}
+    if isinstance(data, list):
+        data = {"roles": data}
+    if not isinstance(data, dict):
+        raise ValueError("requirements file must be a list of roles or a mapping with roles/collections")
+
+    requirements = []
+    for kind in ("roles", "collections"):
+        for spec in data.get(kind) or []:
+            if isinstance(spec, str):
+                if kind == "roles":
+                    # Same "src[,version[,name]]" shorthand as `ansible-galaxy role install`
+                    parts = [p.strip() for p in spec.split(",")]
+                    spec = {key: value for key, value in zip(("src", "version", "name"), parts) if value}
+                else:
+                    name, _, version = spec.partition(":")
+                    spec = {"name": name.strip(), **({"version": version.strip()} if version else {})}
+            if not isinstance(spec, dict) or not (spec.get("name") or spec.get("src")):
+                raise ValueError(f"{kind} entry without a name: {spec!r}")
+            if kind == "roles":
+                name = spec.get("name") or role_name_from_src(str(spec["src"]))
+            else:
+                name = spec["name"]
+            version = str(spec.get("version") or "").lstrip("=") or None
+            requirements.append({"kind": kind[:-1], "name": str(name).strip(), "version": version,
+                                 "spec": spec, "scm": requirement_is_scm(kind[:-1], spec)})
+    return requirements
+
+
+def write_requirements_file(req, directory):
+    """One-entry requirements.yml for `req`, so ansible-galaxy sees src/scm/type/source unchanged."""
+    path = os.path.join(directory, "requirements.yml")
+    with open(path, "w") as f:
+        yaml.safe_dump({f"{req['kind']}s": [req["spec"]]}, f)
+    return path
+
+
+def artifact_filename(kind, name, version):
+    # Collections follow `ansible-galaxy collection build` naming (namespace-name-version)
+    base = name.replace(".", "-") if kind == "collection" else name
+    return f"{base}-{version}.tar.gz"
+
+
+def load_galaxy_index():
+    try:
+        with open(os.path.join(GALAXY_CACHE_DIR, "index.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_artifact(kind, name, version):
+    """Return the index entry for name@version, or for the newest cached version when unpinned."""
+    index = load_galaxy_index()
+    if version:
+        return index.get(f"{kind}:{name}@{version}")
+    candidates = [e for e in index.values() if e["kind"] == kind and e["name"] == name]
+    return max(candidates, key=lambda e: e["cached_at"], default=None)
+
+
+def cache_artifact(path, kind, name, version, deps=()):
+    """Move a tarball into the content-addressed store and index it under name@version."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+    blob = os.path.join(GALAXY_CACHE_DIR, "blobs", f"{sha}.tar.gz")
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    if os.path.exists(blob):
+        os.remove(path)
+    else:
+        os.replace(path, blob)
+
+    entry = {"kind": kind, "name": name, "version": version, "sha256": sha,
+             "deps": list(deps), "cached_at": time.time()}
+    with galaxy_index_lock:
+        index = load_galaxy_index()
+        index[f"{kind}:{name}@{version}"] = entry
+        write_file_atomic(os.path.join(GALAXY_CACHE_DIR, "index.json"), json.dumps(index, indent=1))
+    return entry
+
+
+def blob_path(entry):
+    return os.path.join(GALAXY_CACHE_DIR, "blobs", f"{entry['sha256']}.tar.gz")
+
+
+def fetch_from_source(req, workdir):
+    """Copy/download <name>-<version>.tar.gz from GALAXY_SOURCE into the cache; None if absent."""
+    if not (GALAXY_SOURCE and req["version"]):
+        return None
+    filename = artifact_filename(req["kind"], req["name"], req["version"])
+    target = os.path.join(workdir, filename)
+    if GALAXY_SOURCE.startswith(("http://", "https://")):
+        try:
+            with urllib.request.urlopen(f"{GALAXY_SOURCE.rstrip('/')}/{filename}", timeout=60) as resp, \
+                    open(target, "wb") as out:
+                shutil.copyfileobj(resp, out)
+        except OSError:
+            return None
+    else:
+        source = os.path.join(GALAXY_SOURCE, filename)
+        if not os.path.exists(source):
+            return None
+        shutil.copyfile(source, target)
+    return cache_artifact(target, req["kind"], req["name"], req["version"])
+
+
+def installed_role_version(role_dir):
+    try:
+        with open(os.path.join(role_dir, "meta", ".galaxy_install_info")) as f:
+            return str((yaml.safe_load(f) or {}).get("version") or "") or None
+    except OSError:
+        return None
+
+
+def fetch_from_galaxy(req, workdir):
+    """Download through ansible-galaxy and cache every artifact it brought in (dependencies too)."""
+    download_dir = os.path.join(workdir, "download")
+    requirements_file = write_requirements_file(req, workdir)
+    cached = {}
+    if req["kind"] == "collection":
+        subprocess.run(["ansible-galaxy", "collection", "download", "-r", requirements_file, "-p", download_dir],
+                       check=True, capture_output=True, text=True)
+        for filename in os.listdir(download_dir):
+            match = COLLECTION_TARBALL_RE.match(filename)
+            if match:
+                cached[f"{match['ns']}.{match['name']}"] = (os.path.join(download_dir, filename), match["version"])
+    else:
+        subprocess.run(["ansible-galaxy", "role", "install", "-r", requirements_file, "-p", download_dir],
+                       check=True, capture_output=True, text=True)
+        for name in os.listdir(download_dir):
+            version = installed_role_version(os.path.join(download_dir, name)) or req["version"] or "unversioned"
+            tarball = os.path.join(workdir, artifact_filename("role", name, version))
+            with tarfile.open(tarball, "w:gz") as tar:
+                tar.add(os.path.join(download_dir, name), arcname=name)
+            cached[name] = (tarball, version)
+
+    # The cache is keyed on the name ansible-galaxy actually installed
+    main = req["name"] if req["name"] in cached else (next(iter(cached)) if len(cached) == 1 else None)
+    if main is None:
+        raise RuntimeError(f"could not tell which of {', '.join(sorted(cached)) or 'nothing'} is {req['name']}")
+    deps = []
+    for name, (path, version) in cached.items():
+        if name != main:
+            cache_artifact(path, req["kind"], name, version)
+            deps.append(f"{req['kind']}:{name}@{version}")
+    path, version = cached[main]
+    return cache_artifact(path, req["kind"], main, version, deps)
+
+
+def install_scm_requirement(req):
+    """Install an SCM/URL/path requirement straight through ansible-galaxy, bypassing the cache."""
+    if GALAXY_OFFLINE:
+        raise RuntimeError("SCM and URL sources cannot be installed offline")
+    os.makedirs(GALAXY_CACHE_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="scm-", dir=GALAXY_CACHE_DIR)
+    try:
+        target = ROLES_DIR if req["kind"] == "role" else COLLECTIONS_DIR
+        subprocess.run(["ansible-galaxy", req["kind"], "install", "--force", "-r", write_requirements_file(req, workdir),
+                        "-p", target], check=True, capture_output=True, text=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def resolve_artifact(req):
+    """Return (index entry, origin), trying the cache, then GALAXY_SOURCE, then Galaxy itself."""
+    entry = cached_artifact(req["kind"], req["name"], req["version"])
+    # Unpinned requirements are re-resolved when online so "latest" does not go stale
+    if entry and (req["version"] or GALAXY_OFFLINE):
+        return entry, "cache"
+    os.makedirs(GALAXY_CACHE_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="fetch-", dir=GALAXY_CACHE_DIR)
+    try:
+        entry = fetch_from_source(req, workdir)
+        if entry:
+            return entry, "source"
+        if GALAXY_OFFLINE:
+            raise RuntimeError("not in the cache or the offline source")
+        return fetch_from_galaxy(req, workdir), "galaxy"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def install_role_artifact(entry):
+    """Unpack a cached role tarball into ROLES_DIR/<name>, replacing any previous copy."""
+    os.makedirs(ROLES_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".install-", dir=ROLES_DIR)
+    try:
+        with tarfile.open(blob_path(entry)) as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(staging, filter="data")
+            else:
+                tar.extractall(staging)
+        extracted = os.listdir(staging)
+        # Hand-built source tarballs may hold the role files directly instead of <name>/
+        single = len(extracted) == 1 and os.path.isdir(os.path.join(staging, extracted[0]))
+        source = os.path.join(staging, extracted[0]) if single else staging
+        target = os.path.join(ROLES_DIR, entry["name"])
+        with role_swap_lock:
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.replace(source, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def install_requirement(req):
+    started = time.time()
+    entry = origin = error = None
+    try:
+        if req["scm"]:
+            install_scm_requirement(req)
+            origin = "scm"
+        else:
+            entry, origin = resolve_artifact(req)
+            index = load_galaxy_index()
+            entries = [entry] + [index[key] for key in entry["deps"] if key in index]
+            if req["kind"] == "role":
+                for e in entries:
+                    install_role_artifact(e)
+            else:
+                subprocess.run(["ansible-galaxy", "collection", "install", "--no-deps", "--force",
+                                "-p", COLLECTIONS_DIR] + [blob_path(e) for e in entries],
+                               check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        error = (e.stderr or e.stdout or str(e)).strip()
+    except Exception as e:
+        error = str(e)
+    return {"kind": req["kind"], "name": req["name"],
+            "version": entry["version"] if entry else req["version"],
+            "origin": origin, "ok": error is None, "error": error, "seconds": time.time() - started}
+
+
+def install_requirements(requirements, workers=GALAXY_WORKERS):
+    """Install every requirement concurrently; returns one result dict per requirement, in order."""
+    if not requirements:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(requirements))),
+                            thread_name_prefix="galaxy") as pool:
+        return list(pool.map(install_requirement, requirements))
+
+
+def galaxy_results_message(results):
+    lines = []
+    for r in results:
+        label = f"{r['kind']} {r['name']}" + (f" {r['version']}" if r["version"] else "")
+        if r["ok"]:
+            lines.append(f"✅ {label} installed from {r['origin']} ({r['seconds']:.1f}s)")
+        else:
+            lines.append(f"❌ {label}: {r['error']}")
+    return "\n".join(lines)
+
+
+################### galaxy install cache end ###################
 
 @app.route('/ansible/local/playbooks/roles', methods=['GET', 'POST'])
 def manage_roles():
@@ -534,11 +3245,25 @@ def manage_roles():
         elif 'install_role' in request.form:
             role_name = request.form.get('role_name')
             if role_name:
-                subprocess.run(['ansible-galaxy', 'install', role_name, '-p', ROLES_DIR])
-                message = f"✅ Role '{role_name}' installed from Galaxy."
+                # "name,version" pins the version, which lets later installs come from the cache
+                message = galaxy_results_message(install_requirements(parse_requirements(yaml.safe_dump([role_name]))))
             else:
                 message = "⚠️ Role name required."
 
+        elif 'install_requirements' in request.form:
+            upload = request.files.get('requirements_file')
+            content = upload.read().decode() if upload and upload.filename else request.form.get('requirements', '')
+            try:
+                results = install_requirements(parse_requirements(content))
+            except (ValueError, yaml.YAMLError) as e:
+                message = f"⚠️ Invalid requirements: {e}"
+            else:
+                if wants_json():
+                    return jsonify(results=results)
+                failed = sum(not r["ok"] for r in results)
+                message = f"Installed {len(results) - failed} of {len(results)} requirements."
+                output = galaxy_results_message(results)
+
         elif 'show_tree' in request.form:
             dir_tree = get_directory_tree(ROLES_DIR)
 
@@ -562,17 +3287,17 @@ def manage_roles():
   roles:
     - {role_name}
 """)
-                try:
-                    result = subprocess.run(
-                        ['ansible-playbook', '-i', INVENTORY_FILE, ROLE_PLAYBOOK_FILE],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.STDOUT,
-                        text=True,
-                        check=True
-                    )
-                    output = result.stdout
-                except subprocess.CalledProcessError as e:
-                    output = e.stdout
+                job_id = submit_job(
+                    ['ansible-playbook', '-i', INVENTORY_FILE, ROLE_PLAYBOOK_FILE],
+                    label=f"role {role_name}",
+                    back_url=url_for('manage_roles'),
+                    playbook=ROLE_PLAYBOOK_FILE,
+                    inventory=INVENTORY_FILE,
+                    profile='profile' in request.form
+                )
+                if wants_json():
+                    return jsonify(job_id=job_id), 202
+                return redirect(url_for('job_status', job_id=job_id))
             else:
                 message = "⚠️ Role name required to run playbook."
 
@@ -602,9 +3327,10 @@ def ansible_tower():
         try:
             distro = platform.freedesktop_os_release().get("ID", "").lower()
             
+            env = get_environment(["docker", "docker-compose"])
+
             # 1. Install Docker if not present
-            docker_check = subprocess.run(['which', 'docker'], stdout=subprocess.PIPE, text=True)
-            if not docker_check.stdout.strip():
+            if not env["docker"]["path"]:
                 if "ubuntu" in distro or "debian" in distro:
                     subprocess.run(['sudo', 'apt', 'update'])
                     subprocess.run(['sudo', 'apt', 'install', '-y', 'docker.io'])
@@ -614,8 +3340,7 @@ def ansible_tower():
                     raise Exception(f"Unsupported distro: {distro}. Please install Docker manually.")
 
             # 2. Install docker-compose if not present
-            compose_check = subprocess.run(['which', 'docker-compose'], stdout=subprocess.PIPE, text=True)
-            if not compose_check.stdout.strip():
+            if not env["docker-compose"]["path"]:
                 subprocess.run([
                     'sudo', 'curl', '-SL',
                     'https://github.com/docker/compose/releases/download/v2.32.0/docker-compose-linux-x86_64',
@@ -647,5 +3372,8 @@ def ansible_tower():
 
 
 ########################## Ansible Tower  end ##########################################################
+# Warm the probe cache in the background so the first page load does not pay for it
+threading.Thread(target=get_environment, name="env-warmup", daemon=True).start()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5002, debug=True)
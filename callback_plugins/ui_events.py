@@ -0,0 +1,101 @@
+# Callback plugin used by ansible-ui to capture structured playbook events.
+#
+# ansible-ui enables it for every run and points ANSIBLE_UI_EVENTS_FILE at a
+# per-job file; each event is appended as one JSON object per line so the UI
+# can parse the run incrementally while it is still going.
+from __future__ import annotations
+
+DOCUMENTATION = '''
+    name: ui_events
+    type: notification
+    short_description: Write playbook events as JSON lines for ansible-ui
+    description:
+      - Appends one JSON object per playbook, play, task and host result event
+        to the file named by the ANSIBLE_UI_EVENTS_FILE environment variable.
+    requirements:
+      - enable in configuration
+'''
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+# Keep events small: only the first part of long messages is recorded
+MAX_TEXT = 2000
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'notification'
+    CALLBACK_NAME = 'ui_events'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super().__init__()
+        path = os.environ.get('ANSIBLE_UI_EVENTS_FILE')
+        self._out = open(path, 'a', buffering=1) if path else None
+        self._play = None
+
+    def _emit(self, event, **data):
+        if self._out is None:
+            return
+        data['event'] = event
+        data['time'] = time.time()
+        self._out.write(json.dumps(data, default=str) + '\n')
+
+    def _task_fields(self, task):
+        return {
+            'play': self._play,
+            'task': task.get_name().strip(),
+            'task_uuid': task._uuid,
+            'action': task.action,
+        }
+
+    def _result(self, event, result, **extra):
+        res = result._result
+        data = self._task_fields(result._task)
+        data.update(
+            host=result._host.get_name(),
+            changed=bool(res.get('changed', False)),
+            msg=str(res.get('msg', ''))[:MAX_TEXT],
+            **extra
+        )
+        if event in ('runner_on_failed', 'runner_on_unreachable'):
+            data['stderr'] = str(res.get('stderr', ''))[:MAX_TEXT]
+        self._emit(event, **data)
+
+    def v2_playbook_on_start(self, playbook):
+        self._emit('playbook_start', playbook=playbook._file_name)
+
+    def v2_playbook_on_play_start(self, play):
+        self._play = play.get_name().strip()
+        self._emit('play_start', play=self._play, play_uuid=play._uuid)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._emit('task_start', **self._task_fields(task))
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self._emit('task_start', handler=True, **self._task_fields(task))
+
+    def v2_runner_on_start(self, host, task):
+        self._emit('runner_on_start', host=host.get_name(), **self._task_fields(task))
+
+    def v2_runner_on_ok(self, result):
+        self._result('runner_on_ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._result('runner_on_failed', result, ignore_errors=ignore_errors)
+
+    def v2_runner_on_skipped(self, result):
+        self._result('runner_on_skipped', result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._result('runner_on_unreachable', result)
+
+    def v2_playbook_on_stats(self, stats):
+        self._emit('playbook_stats', hosts={h: stats.summarize(h) for h in sorted(stats.processed)})
+        if self._out is not None:
+            self._out.close()
+            self._out = None
@@ -1,13 +1,20 @@
 from __future__ import annotations
 
 import argparse
+import functools
+import json
 import logging
 import os
 import re
 import sys
+import threading
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor
 from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
 
 
 BASE_COLLECTIONS_PATH = '/usr/share/ansible/collections'
@@ -30,6 +37,16 @@ EXCLUDE_REQUIREMENTS = frozenset((
 ))
 
 
+# Files whose appearance or change can alter what a collection contributes; files a
+# collection references (and -r includes) are tracked in addition to these.
+COLLECTION_INPUT_FILES = (
+    'MANIFEST.json', 'galaxy.yml',
+    os.path.join('meta', 'execution-environment.yml'),
+    os.path.join('meta', 'execution-environment.yaml'),
+    'requirements.txt', 'bindep.txt',
+)
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -89,6 +106,67 @@ class CollectionDefinition:
         return req_file
 
 
+class IntrospectCache:
+    """
+    Persistent per-collection scan results, keyed on the collection path and reused
+    while the (mtime, size) of every input file of that collection is unchanged.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, 'introspect-cache.json')
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data['collections']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @staticmethod
+    def fingerprint(collection_path, files):
+        result = {}
+        for rel_path in files:
+            try:
+                st = os.stat(os.path.join(collection_path, rel_path))
+                result[rel_path] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                result[rel_path] = None
+        return result
+
+    def get(self, collection_path):
+        """Return the cached (key, pip_lines, bindep_lines) if still valid, else None."""
+        entry = self.entries.get(collection_path)
+        valid = entry is not None and self.fingerprint(collection_path, entry['files']) == entry['files']
+        with self.lock:
+            if valid:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return (entry['key'], entry['pip'], entry['bindep']) if valid else None
+
+    def put(self, collection_path, input_files, result):
+        files = sorted(set(COLLECTION_INPUT_FILES) | {os.path.relpath(p, collection_path) for p in input_files})
+        key, pip_lines, bindep_lines = result
+        with self.lock:
+            self.entries[collection_path] = {
+                'files': self.fingerprint(collection_path, files),
+                'key': key, 'pip': pip_lines, 'bindep': bindep_lines,
+            }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.VERSION, 'collections': self.entries}, f)
+        os.replace(tmp_path, self.path)
+
+
 def line_is_empty(line):
     return bool((not line.strip()) or line.startswith('#'))
 
@@ -101,7 +179,9 @@ def read_req_file(path):
         return f.read()
 
 
-def pip_file_data(path):
+def pip_file_data(path, seen=None):
+    if seen is not None:
+        seen.append(path)
     pip_content = read_req_file(path)
 
     pip_lines = []
@@ -111,7 +191,7 @@ def pip_file_data(path):
         if line.startswith('-r') or line.startswith('--requirement'):
             _, new_filename = line.split(None, 1)
             new_path = os.path.join(os.path.dirname(path or '.'), new_filename)
-            pip_lines.extend(pip_file_data(new_path))
+            pip_lines.extend(pip_file_data(new_path, seen))
         else:
             pip_lines.append(line)
 
@@ -130,34 +210,70 @@ def bindep_file_data(path):
     return sys_lines
 
 
-def process_collection(path):
+def process_collection(path, seen=None):
     """Return a tuple of (python_dependencies, system_dependencies) for the
     collection install path given.
     Both items returned are a list of dependencies.
 
     :param str path: root directory of collection (this would contain galaxy.yml file)
+    :param list seen: If given, every requirements file read is appended to it.
     """
     col_def = CollectionDefinition(path)
 
     py_file = col_def.get_dependency('python')
     pip_lines = []
     if py_file:
-        pip_lines = pip_file_data(os.path.join(path, py_file))
+        pip_lines = pip_file_data(os.path.join(path, py_file), seen)
 
     sys_file = col_def.get_dependency('system')
     bindep_lines = []
     if sys_file:
+        if seen is not None:
+            seen.append(os.path.join(path, sys_file))
         bindep_lines = bindep_file_data(os.path.join(path, sys_file))
 
     return (pip_lines, bindep_lines)
 
 
+def find_collection_dirs(path_root):
+    """Return the sorted ansible_collections/<namespace>/<name> directories under path_root."""
+    candidates = []
+    if not os.path.exists(path_root):
+        return candidates
+    with os.scandir(path_root) as namespaces:
+        for namespace in sorted(namespaces, key=lambda e: e.name):
+            if not namespace.is_dir():
+                continue
+            with os.scandir(namespace.path) as names:
+                candidates.extend(sorted(e.path for e in names if e.is_dir()))
+    return candidates
+
+
+def scan_collection(collection_dir, cache=None):
+    """Return (namespace.name, pip_lines, bindep_lines), or None if collection_dir holds no collection."""
+    with os.scandir(collection_dir) as entries:
+        if not any(e.name in ('galaxy.yml', 'MANIFEST.json') for e in entries):
+            return None
+    if cache is not None and (cached := cache.get(collection_dir)) is not None:
+        return cached
+
+    seen: list[str] = []
+    col_pip_lines, col_sys_lines = process_collection(collection_dir, seen)
+    namespace, name = [p for p in collection_dir.split(os.path.sep) if p][-2:]
+    result = (f'{namespace}.{name}', col_pip_lines, col_sys_lines)
+    if cache is not None:
+        cache.put(collection_dir, seen, result)
+    return result
+
+
 def process(data_dir=BASE_COLLECTIONS_PATH,
             user_pip=None,
             user_bindep=None,
             exclude_pip=None,
             exclude_bindep=None,
-            exclude_collections=None):
+            exclude_collections=None,
+            workers=None,
+            cache=None):
     """
     Build a dictionary of Python and system requirements from any collections
     installed in data_dir, and any user specified requirements.
@@ -181,31 +297,26 @@ def process(data_dir=BASE_COLLECTIONS_PATH,
               'a.b',
           ]
        }
+
+    Collections are scanned on a pool of `workers` threads (1 scans serially);
+    results keep the sorted namespace/name order either way. With an
+    IntrospectCache, unchanged collections are taken from the cache.
     """
-    paths = []
-    path_root = os.path.join(data_dir, 'ansible_collections')
+    candidates = find_collection_dirs(os.path.join(data_dir, 'ansible_collections'))
 
-    # build a list of all the valid collection paths
-    if os.path.exists(path_root):
-        for namespace in sorted(os.listdir(path_root)):
-            if not os.path.isdir(os.path.join(path_root, namespace)):
-                continue
-            for name in sorted(os.listdir(os.path.join(path_root, namespace))):
-                collection_dir = os.path.join(path_root, namespace, name)
-                if not os.path.isdir(collection_dir):
-                    continue
-                files_list = os.listdir(collection_dir)
-                if 'galaxy.yml' in files_list or 'MANIFEST.json' in files_list:
-                    paths.append(collection_dir)
+    if workers == 1 or len(candidates) < 2:
+        scanned = [scan_collection(path, cache) for path in candidates]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            scanned = list(pool.map(lambda path: scan_collection(path, cache), candidates))
 
     # populate the requirements content
     py_req = {}
     sys_req = {}
-    for path in paths:
-        col_pip_lines, col_sys_lines = process_collection(path)
-        col_def = CollectionDefinition(path)
-        namespace, name = col_def.namespace_name()
-        key = f'{namespace}.{name}'
+    for result in scanned:
+        if result is None:
+            continue
+        key, col_pip_lines, col_sys_lines = result
 
         if col_pip_lines:
             py_req[key] = col_pip_lines
@@ -276,6 +387,50 @@ def strip_comments(reqs: dict[str, list]) -> dict[str, list]:
     return result
 
 
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+class ExclusionMatcher:
+    """
+    Precompiled form of an exclusion list (see should_be_excluded).
+
+    Plain names go into a set of lowercased names; '~' regular expressions are
+    combined into one alternation, so a lookup costs one set probe and one regex
+    match however long the list is.
+    """
+
+    def __init__(self, exclusion_list: list[str]):
+        self.names: set[str] = set()
+        patterns: list[str] = []
+        for exclude_value in exclusion_list:
+            if exclude_value[0] == "~":
+                patterns.append(exclude_value[1:].lower())
+            else:
+                self.names.add(exclude_value.lower())
+
+        self.regexes: list[re.Pattern] = []
+        if patterns and not any(_BACKREFERENCE.search(p) for p in patterns):
+            try:
+                self.regexes = [re.compile('|'.join(f'(?:{p})' for p in patterns))]
+            except re.error:
+                # Duplicate group names or global flags cannot be combined
+                self.regexes = [re.compile(p) for p in patterns]
+        else:
+            # Numbered back-references would point at the wrong group once combined
+            self.regexes = [re.compile(p) for p in patterns]
+
+    def __call__(self, value: str) -> bool:
+        value = value.lower()
+        if value in self.names:
+            return True
+        return any(regex.fullmatch(value) for regex in self.regexes)
+
+
+@functools.lru_cache(maxsize=64)
+def _exclusion_matcher(exclusion_list: tuple[str, ...]) -> ExclusionMatcher:
+    return ExclusionMatcher(list(exclusion_list))
+
+
 def should_be_excluded(value: str, exclusion_list: list[str]) -> bool:
     """
     Test if `value` matches against any value in `exclusion_list`.
@@ -286,20 +441,139 @@ def should_be_excluded(value: str, exclusion_list: list[str]) -> bool:
 
     :return: True if the value should be excluded, False otherwise.
     """
-    for exclude_value in exclusion_list:
-        if exclude_value[0] == "~":
-            pattern = exclude_value[1:]
-            if re.fullmatch(pattern.lower(), value.lower()):
-                return True
-        elif exclude_value.lower() == value.lower():
-            return True
-    return False
+    return _exclusion_matcher(tuple(exclusion_list))(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def requirement_name(line: str) -> str | None:
+    """Return the PEP508 name of a requirement line, or None if it is not PEP508 compliant."""
+    try:
+        return Requirement(line).name
+    except InvalidRequirement:
+        return None
+
+
+def specifier_conflict(specifier: SpecifierSet) -> str | None:
+    """
+    Return why no version can satisfy `specifier`, or None if it looks satisfiable.
+
+    Only catches the common cases: different exact pins, a pin outside the other
+    clauses, and lower/upper bounds that do not overlap.
+    """
+    pins: dict[Version | str, str] = {}
+    lower: tuple[Version, bool] | None = None
+    upper: tuple[Version, bool] | None = None
+    for spec in specifier:
+        if spec.operator in ('==', '===') and '*' not in spec.version:
+            key: Version | str = spec.version
+            if spec.operator == '==':
+                try:
+                    key = Version(spec.version)
+                except InvalidVersion:
+                    pass
+            pins.setdefault(key, spec.version)
+            continue
+        try:
+            version = Version(spec.version.rstrip('.*'))
+        except InvalidVersion:
+            continue
+        if spec.operator in ('>=', '>', '~='):
+            bound = (version, spec.operator != '>')
+            if lower is None or bound[0] > lower[0] or (bound[0] == lower[0] and not bound[1]):
+                lower = bound
+        elif spec.operator in ('<=', '<'):
+            bound = (version, spec.operator == '<=')
+            if upper is None or bound[0] < upper[0] or (bound[0] == upper[0] and not bound[1]):
+                upper = bound
+
+    if pins:
+        if any(specifier.contains(pin, prereleases=True) for pin in pins.values()):
+            return None
+        if len(pins) > 1:
+            return f"pinned to {', '.join(sorted(pins.values()))}"
+        return f'{next(iter(pins.values()))} does not satisfy {specifier}'
+    if lower and upper and (lower[0] > upper[0] or (lower[0] == upper[0] and not (lower[1] and upper[1]))):
+        return f'{specifier} is an empty range'
+    return None
+
+
+def tighten_specifier(specifier: SpecifierSet) -> SpecifierSet:
+    """Drop lower (>=, >) and upper (<=, <) bounds made redundant by a stricter one."""
+    lower = upper = None
+    kept = []
+    for spec in specifier:
+        try:
+            version = Version(spec.version)
+        except InvalidVersion:
+            kept.append(spec)
+            continue
+        if spec.operator in ('>=', '>'):
+            if lower is None or version > lower[0] or (version == lower[0] and spec.operator == '>'):
+                lower = (version, spec)
+        elif spec.operator in ('<=', '<'):
+            if upper is None or version < upper[0] or (version == upper[0] and spec.operator == '<'):
+                upper = (version, spec)
+        else:
+            kept.append(spec)
+    kept += [bound[1] for bound in (lower, upper) if bound]
+    return SpecifierSet(','.join(str(spec) for spec in kept))
+
+
+def merge_requirements(entries: list[tuple[str, str]]) -> list[str]:
+    """
+    Merge PEP508 requirement lines that name the same project.
+
+    Lines are grouped by canonical name and environment marker; each group becomes a
+    single line with the union of extras, the intersection of the specifiers (minus
+    redundant bounds) and the combined source annotation. Groups that cannot be satisfied are logged and
+    annotated with a CONFLICT note.
+
+    :param list entries: (requirement line, collection name) pairs, in output order.
+
+    :return: A list of merged and annotated requirements.
+    """
+    groups: dict[tuple[str, str], list[tuple[Requirement, str]]] = {}
+    for line, collection in entries:
+        req = Requirement(line)
+        groups.setdefault((canonicalize_name(req.name), str(req.marker or '')), []).append((req, collection))
+
+    merged_lines: list[str] = []
+    for members in groups.values():
+        first = members[0][0]
+        extras = sorted(set().union(*(req.extras for req, _ in members)))
+        specifier = SpecifierSet()
+        for req, _ in members:
+            specifier &= req.specifier
+        urls = sorted({req.url for req, _ in members if req.url})
+        sources = list(dict.fromkeys(collection for _, collection in members))
+
+        line = first.name + (f"[{','.join(extras)}]" if extras else '')
+        if urls:
+            line += f' @ {urls[0]}'
+            conflict = f"different URLs: {', '.join(urls)}" if len(urls) > 1 else None
+            if specifier and not conflict:
+                conflict = f'URL and version specifier {specifier}'
+        else:
+            conflict = specifier_conflict(specifier)
+            # Keep every clause of an unsatisfiable set so the conflict stays visible
+            line += str(specifier if conflict else tighten_specifier(specifier))
+        if first.marker:
+            line += f' ; {first.marker}' if urls else f'; {first.marker}'
+
+        annotation = f"  # from collection {', '.join(sources)}"
+        if conflict:
+            logger.warning("Conflicting requirements for '%s' from %s: %s", first.name, ', '.join(sources), conflict)
+            annotation += f' (CONFLICT: {conflict})'
+        merged_lines.append(line + annotation)
+
+    return merged_lines
 
 
 def filter_requirements(reqs: dict[str, list],
                         exclude: list[str] | None = None,
                         exclude_collections: list[str] | None = None,
-                        is_python: bool = True) -> list[str]:
+                        is_python: bool = True,
+                        merge: bool = False) -> list[str]:
     """
     Given a dictionary of Python requirement lines keyed off collections,
     return a list of cleaned up (no source comments) requirements
@@ -307,41 +581,39 @@ def filter_requirements(reqs: dict[str, list],
 
     Currently, non-pep508 compliant Python entries are passed through. We also no
     longer attempt to normalize names (replace '_' with '-', etc), other than
-    lowercasing it for exclusion matching, since we no longer are attempting
-    to combine similar entries.
+    lowercasing it for exclusion matching, since by default we no longer are
+    attempting to combine similar entries. With `merge`, Python entries for the
+    same project are combined by merge_requirements().
 
     :param dict reqs: A dict of either Python or system requirements, keyed by collection name.
     :param list exclude: A list of requirements to be excluded from the output.
     :param list exclude_collections: A list of collection names from which to exclude all requirements.
     :param bool is_python: This should be set to True for Python requirements, as each
         will be tested for PEP508 compliance. This should be set to False for system requirements.
+    :param bool merge: Combine Python requirements naming the same project into one line.
 
     :return: A list of filtered and annotated requirements.
     """
-    exclusions: list[str] = []
-    collection_ignore_list: list[str] = []
-
-    if exclude:
-        exclusions = exclude.copy()
-    if exclude_collections:
-        collection_ignore_list = exclude_collections.copy()
+    is_excluded = ExclusionMatcher(exclude or [])
+    is_ignored_collection = ExclusionMatcher(exclude_collections or [])
 
     annotated_lines: list[str] = []
+    # With merge, PEP508 lines are collected here and the position of the first one is remembered
+    to_merge: list[tuple[str, str]] = []
+    merge_at: int | None = None
     uncommented_reqs = strip_comments(reqs)
 
     for collection, lines in uncommented_reqs.items():
         # Bypass this collection if we've been told to ignore all requirements from it.
-        if should_be_excluded(collection, collection_ignore_list):
+        if is_ignored_collection(collection):
             logger.debug("# Excluding all requirements from collection '%s'", collection)
             continue
 
         for line in lines:
             # Determine the simple name based on type of requirement
             if is_python:
-                try:
-                    parsed_req = Requirement(line)
-                    name = parsed_req.name
-                except InvalidRequirement:
+                name = requirement_name(line)
+                if name is None:
                     logger.warning(
                         "Passing through non-PEP508 compliant line '%s' from collection '%s'",
                         line, collection
@@ -359,12 +631,21 @@ def filter_requirements(reqs: dict[str, list],
                     logger.debug("# Excluding requirement '%s' from '%s'", name, collection)
                     continue
 
-                if should_be_excluded(lower_name, exclusions):
+                if is_excluded(lower_name):
                     logger.debug("# Explicitly excluding requirement '%s' from '%s'", name, collection)
                     continue
 
+            if merge and is_python:
+                if merge_at is None:
+                    merge_at = len(annotated_lines)
+                to_merge.append((line, collection))
+                continue
+
             annotated_lines.append(f'{line}  # from collection {collection}')
 
+    if to_merge:
+        annotated_lines[merge_at:merge_at] = merge_requirements(to_merge)
+
     return annotated_lines
 
 
@@ -389,20 +670,30 @@ def parse_args(args=None):
 
 
 def run_introspect(args, log):
+    cache = IntrospectCache(args.cache_dir) if args.cache_dir else None
     data = process(args.folder,
                    user_pip=args.user_pip,
                    user_bindep=args.user_bindep,
                    exclude_pip=args.exclude_pip,
                    exclude_bindep=args.exclude_bindep,
-                   exclude_collections=args.exclude_collections)
+                   exclude_collections=args.exclude_collections,
+                   workers=args.workers,
+                   cache=cache)
     log.info('# Dependency data for %s', args.folder)
 
+    if cache is not None:
+        cache.save()
+        if args.cache_stats:
+            # stderr, so the YAML on stdout stays parseable
+            print(f'# introspect cache: {cache.hits} hits, {cache.misses} misses', file=sys.stderr)
+
     excluded_collections = data.pop('excluded_collections', None)
 
     data['python'] = filter_requirements(
         data['python'],
         exclude=data['python'].pop('exclude', []),
         exclude_collections=excluded_collections,
+        merge=args.merge_pip,
     )
 
     data['system'] = filter_requirements(
@@ -464,6 +755,22 @@ def create_introspect_parser(parser):
         '--exclude-collection-reqs', dest='exclude_collections',
         help='An additional file to exclude all requirements from the listed collections.'
     )
+    introspect_parser.add_argument(
+        '--merge-pip-reqs', dest='merge_pip', action='store_true',
+        help='Combine pip requirements for the same package into one line, intersecting their version specifiers.'
+    )
+    introspect_parser.add_argument(
+        '--workers', dest='workers', type=int, default=None,
+        help='Number of threads used to scan collections (default: chosen by Python, 1 scans serially).'
+    )
+    introspect_parser.add_argument(
+        '--cache-dir', dest='cache_dir',
+        help='Directory for a persistent cache of per-collection results; unchanged collections are not re-read.'
+    )
+    introspect_parser.add_argument(
+        '--cache-stats', dest='cache_stats', action='store_true',
+        help='Report cache hits and misses on stderr (requires --cache-dir).'
+    )
     introspect_parser.add_argument(
         '--write-pip', dest='write_pip',
         help='Write the combined pip requirements file to this location.'
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""Ansible dynamic inventory backed by the ansible-ui worker node state.
+
+    ansible-playbook -i dynamic_inventory.py playbook.yml
+    ansible-inventory -i dynamic_inventory.py --graph
+
+The UI builds the inventory from the running worker containers (grouped by the
+host group they were created with). Set ANSIBLE_UI_URL when the UI is not
+listening on http://127.0.0.1:5002.
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+ANSIBLE_UI_URL = os.environ.get("ANSIBLE_UI_URL", "http://127.0.0.1:5002")
+
+
+def fetch(params=None):
+    url = f"{ANSIBLE_UI_URL.rstrip('/')}/ansible/local/inventory"
+    if params:
+        url += "?" + urllib.parse.urlencode(params)
+    with urllib.request.urlopen(url, timeout=30) as resp:
+        return json.load(resp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ansible-ui dynamic inventory")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--list", action="store_true")
+    group.add_argument("--host")
+    args = parser.parse_args()
+
+    data = fetch({"host": args.host} if args.host else None)
+    json.dump(data, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()